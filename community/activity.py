@@ -0,0 +1,173 @@
+"""Write-behind tracking of UserProfile.last_active.
+
+LastActiveMiddleware records each authenticated request in last_seen, an
+ActivityBuffer that keeps at most one timestamp per user per
+COMMUNITY_ACTIVITY_INTERVAL minutes: the first request in a window is
+claimed with cache.add(), so other processes skip the user too. Pending
+timestamps are written by flush() in one UPDATE joined to a VALUES list,
+either when `max_pending` users are waiting, on a timer, or at exit.
+last_active is indexed, so active_count() is an index range count.
+"""
+import atexit
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections
+from django.utils import timezone
+
+from . import cache as community_cache
+
+BATCH_SIZE = 500
+
+
+def activity_interval():
+    """Minutes between two recorded timestamps of the same user"""
+    return getattr(settings, 'COMMUNITY_ACTIVITY_INTERVAL', 5)
+
+
+class ActivityBuffer:
+    """Coalesces last_active stamps per user until flush().
+
+    Like PostCounterBuffer, a flush_interval of 0 makes it write-through.
+    """
+
+    def __init__(self, flush_interval=None, max_pending=None, use_timer=True):
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._use_timer = use_timer
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._recorded = {}  # user_id -> monotonic time of the last stamp
+        self._timer = None
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'COMMUNITY_ACTIVITY_FLUSH_INTERVAL', 30)
+
+    @property
+    def max_pending(self):
+        if self._max_pending is not None:
+            return self._max_pending
+        return getattr(settings, 'COMMUNITY_ACTIVITY_MAX_PENDING', 1000)
+
+    def record(self, user_id, when=None):
+        """Note that a user was active; returns False if throttled."""
+        interval = activity_interval() * 60
+        now = time.monotonic()
+        with self._lock:
+            last = self._recorded.get(user_id)
+            if last is not None and now - last < interval:
+                return False
+            self._recorded[user_id] = now
+        if interval and not cache.add(community_cache.key('active', user_id), 1, interval):
+            return False
+        with self._lock:
+            self._pending[user_id] = when or timezone.now()
+            due = not self.flush_interval or len(self._pending) >= self.max_pending
+            if not due and self._use_timer and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+        return True
+
+    def pending(self, user_id):
+        """The unflushed timestamp of a user, if any."""
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def flush(self):
+        """Write all pending timestamps; returns the number of profiles updated."""
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            # Forget users whose window has passed so the map doesn't grow forever
+            cutoff = time.monotonic() - activity_interval() * 60
+            self._recorded = {pk: at for pk, at in self._recorded.items() if at > cutoff}
+        items = list(pending.items())
+        return sum(
+            write(items[start:start + BATCH_SIZE])
+            for start in range(0, len(items), BATCH_SIZE)
+        )
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            # The timer thread owns its own connection; don't leak it.
+            connections.close_all()
+
+
+def write(stamps):
+    """Apply [(user_id, datetime)] to last_active in one UPDATE ... FROM (VALUES ...).
+
+    A timestamp never moves last_active backwards.
+    """
+    if not stamps:
+        return 0
+    from .models import UserProfile
+    table = connection.ops.quote_name(UserProfile._meta.db_table)
+    rows = ', '.join(['(%s, %s)'] * len(stamps))
+    params = []
+    for user_id, when in stamps:
+        params += [user_id, connection.ops.adapt_datetimefield_value(when)]
+    # PostgreSQL and SQLite both call the columns of a VALUES list column1, column2, ...
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {table} SET last_active = stamps.last_active
+            FROM (
+                SELECT column1 AS user_id, column2 AS last_active FROM (VALUES {rows}) AS v
+            ) AS stamps
+            WHERE {table}.user_id = stamps.user_id
+              AND ({table}.last_active IS NULL OR {table}.last_active < stamps.last_active)
+        """, params)
+        return cursor.rowcount
+
+
+def active_count(minutes=None):
+    """Number of users active in the last `minutes` (default: one interval)"""
+    from .models import UserProfile
+    since = timezone.now() - timedelta(minutes=minutes or activity_interval())
+    return UserProfile.objects.filter(last_active__gte=since).count()
+
+
+class LastActiveMiddleware:
+    """Stamps last_active for authenticated requests, at most once per interval.
+
+    Runs after the view, so users authenticated by DRF (JWT) are seen too:
+    DRF copies the user onto the underlying HttpRequest.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            last_seen.record(user.pk)
+        return response
+
+
+def _flush_at_exit():
+    # last_active is advisory; don't fail shutdown over it (e.g. when the
+    # test database is already gone)
+    try:
+        last_seen.flush()
+    except DatabaseError:
+        pass
+
+
+last_seen = ActivityBuffer()
+atexit.register(_flush_at_exit)
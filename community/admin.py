@@ -1,41 +1,96 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
 from django.utils.html import format_html
-from django.db.models import Count
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from .models import *
-import json
+from .pagination import EstimatedCountPaginator
+from .revisions import history
+from . import search
+from . import cache as community_cache
+from . import moderation
 from django.urls import reverse
 from django.utils import timezone
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist for tables too big to COUNT(*) on every page view"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+class CommentInlineFormSet(BaseInlineFormSet):
+    """Edits one page of a post's comments rather than all of them"""
+    per_page = 20
+    page_param = 'comments_page'
+    request = None
+
+    def get_queryset(self):
+        if not hasattr(self, 'page'):
+            # The change links print Comment.__str__, which shows author and post
+            queryset = super().get_queryset().select_related('author', 'post')
+            self.paginator = Paginator(queryset, self.per_page)
+            number = self.request.GET.get(self.page_param) if self.request else None
+            self.page = self.paginator.get_page(number)
+        return self.page.object_list
+
 class CommentInline(admin.TabularInline):
     model = Comment
+    formset = CommentInlineFormSet
+    template = 'admin/community/paginated_tabular.html'
     extra = 0
-    fields = ('content', 'author', 'is_anonymous', 'created_at', 'is_edited')
-    readonly_fields = ('created_at', 'is_edited')
+    fields = ('content', 'author', 'is_anonymous', 'created_at', 'is_edited', 'is_hidden')
+    readonly_fields = ('author', 'created_at', 'is_edited')
     show_change_link = True
 
-class PostAdmin(admin.ModelAdmin):
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.request = request
+        return formset
+
+class CommentRevisionInline(admin.TabularInline):
+    model = CommentRevision
+    extra = 0
+    fields = ('edited_at', 'previous_content')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_formset(self, request, obj=None, **kwargs):
+        # Replay the comment's revisions once, newest first, rather than per row
+        self._previous = {
+            revision.pk: content for revision, content in history(obj.content, obj.revisions.all())
+        } if obj else {}
+        return super().get_formset(request, obj, **kwargs)
+
+    def previous_content(self, obj):
+        return format_html('<pre>{}</pre>', self._previous.get(obj.pk, ''))
+    previous_content.short_description = 'Previous Content'
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('title', 'truncated_content', 'author', 'category',
                     'engagement_score', 'is_pinned', 'published_status')
-    list_filter = ('category', 'is_anonymous', 'is_pinned', 'is_draft', 'created_at')
+    list_filter = ('category', 'is_anonymous', 'is_pinned', 'is_draft', 'is_hidden', 'created_at')
     search_fields = ('title', 'content', 'author__username')
     list_select_related = ['author', 'category']
     inlines = [CommentInline]
-    readonly_fields = ('engagement_score', 'slug', 'views', 'shares')
+    readonly_fields = ('engagement_score', 'slug', 'likes_count', 'views', 'shares')
     date_hierarchy = 'created_at'
-    autocomplete_fields = ['author', 'category']
+    autocomplete_fields = ['author', 'category', 'likes']
 
     fieldsets = (
         (None, {
             'fields': ('title', 'slug', 'content', 'author', 'category')
         }),
         ('Visibility', {
-            'fields': ('is_anonymous', 'is_pinned', 'is_draft')
+            'fields': ('is_anonymous', 'is_pinned', 'is_draft', 'is_hidden')
         }),
         ('Timing', {
             'fields': ('scheduled_publish_time',)
         }),
         ('Engagement', {
-            'fields': ('engagement_score', 'likes', 'views', 'shares')
+            'fields': ('engagement_score', 'likes', 'likes_count', 'views', 'shares')
         }),
     )
 
@@ -49,12 +104,18 @@ class PostAdmin(admin.ModelAdmin):
         return "Published" if obj.is_published else "Draft"
     published_status.admin_order_field = 'is_draft'
 
+    def get_search_results(self, request, queryset, search_term):
+        ids = search.matching_ids('post', search_term) if search_term else None
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(Q(pk__in=ids) | Q(author__username__icontains=search_term)), False
+
 class EventAdmin(admin.ModelAdmin):
     list_display = ('title', 'event_date', 'status', 'available_seats',
                     'registration_status', 'is_featured')
     list_filter = ('status', 'event_category', 'is_featured')
     search_fields = ('title', 'description', 'location')
-    readonly_fields = ('available_seats', 'slug')
+    readonly_fields = ('available_seats', 'seats_taken', 'slug')
     date_hierarchy = 'event_date'
     autocomplete_fields = [] # Remove or correct this line
 
@@ -64,13 +125,14 @@ class EventAdmin(admin.ModelAdmin):
         }),
         ('Details', {
             'fields': ('event_date', 'registration_deadline', 'capacity',
-                       'thumbnail', 'location')
+                       'seats_taken', 'thumbnail', 'location')
         }),
         ('Metadata', {
             'fields': ('is_featured', 'event_category')
         }),
     )
 
+    # available_seats and registration_status only read columns of the row
     def registration_status(self, obj):
         now = timezone.now()
         if obj.registration_deadline and obj.registration_deadline < now:
@@ -78,29 +140,43 @@ class EventAdmin(admin.ModelAdmin):
         return "Open" if obj.available_seats > 0 else "Full"
     registration_status.short_description = 'Registration'
 
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(LargeTableAdmin):
     list_display = ('user', 'verification_status', 'community_rank',
-                    'last_active', 'post_count')
+                    'community_score', 'last_active', 'post_count')
     search_fields = ('user__username', 'bio')
-    list_filter = ('verification_status', 'community_rank')
+    # Ranks are nearly unique per user, too many values for a sidebar filter;
+    # sort by the column instead
+    list_filter = ('verification_status',)
     list_select_related = ['user']
-    readonly_fields = ('last_active',)
+    readonly_fields = ('community_rank', 'community_score', 'last_active')
+
+    def get_queryset(self, request):
+        # A correlated subquery is only evaluated for the rows on the page
+        posts = (
+            Post.objects.filter(author=OuterRef('user')).order_by()
+            .values('author').annotate(total=Count('pk')).values('total')
+        )
+        return super().get_queryset(request).annotate(post_total=Coalesce(Subquery(posts), 0))
 
     def post_count(self, obj):
-        return obj.user.posts.count()
+        return obj.post_total
     post_count.short_description = 'Posts'
+    post_count.admin_order_field = 'post_total'
 
-class EventRegistrationAdmin(admin.ModelAdmin):
-    list_display = ('event', 'user', 'created_at')
-    list_filter = ('event__status',)
+class EventRegistrationAdmin(LargeTableAdmin):
+    list_display = ('event', 'user', 'status', 'created_at')
+    list_select_related = ('event', 'user')
+    list_filter = ('status', 'event__status')
     search_fields = ('event__title', 'user__username')
     autocomplete_fields = ['event', 'user']
 
-class ReportAdmin(admin.ModelAdmin):
+class ReportAdmin(LargeTableAdmin):
     list_display = ('reporter', 'content_object', 'report_type', 'status', 'created_at')
     list_filter = ('report_type', 'status')
     search_fields = ('reporter__username', 'description')
     readonly_fields = ('reporter', 'created_at')
+    # Comment.__str__ shows its author and post
+    list_select_related = ('reporter', 'post', 'comment__author', 'comment__post')
     actions = ['mark_as_resolved']
 
     def content_object(self, obj):
@@ -108,7 +184,49 @@ class ReportAdmin(admin.ModelAdmin):
     content_object.short_description = 'Reported Content'
 
     def mark_as_resolved(self, request, queryset):
-        queryset.update(status='resolved')
+        moderation.close_reports(queryset, 'resolved')
+
+    def get_readonly_fields(self, request, obj=None):
+        # A filed report stays with its moderation item
+        return self.readonly_fields + (('post', 'comment') if obj else ())
+
+    # Keep the moderation queue's counts in step with edits and deletions
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change:
+            moderation.refresh(
+                moderation.items_for(Report.objects.filter(pk=obj.pk)), restore=obj.status != 'resolved'
+            )
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Report.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        item_ids = moderation.items_for(queryset)
+        super().delete_queryset(request, queryset)
+        moderation.refresh(item_ids)
+
+class ModerationItemAdmin(LargeTableAdmin):
+    list_display = ('target', 'status', 'report_count', 'reporter_count', 'priority', 'last_reported_at')
+    list_filter = ('status',)
+    list_select_related = ('post', 'comment__author', 'comment__post')
+    readonly_fields = ('post', 'comment', 'report_count', 'reporter_count', 'priority', 'last_reported_at')
+    ordering = ('-priority', '-last_reported_at')
+    actions = ['resolve', 'dismiss']
+
+    def target(self, obj):
+        return obj.target
+    target.short_description = 'Reported Content'
+
+    def resolve(self, request, queryset):
+        closed = moderation.close(queryset, 'resolved')
+        self.message_user(request, f"Resolved {closed} items.")
+    resolve.short_description = 'Resolve selected items and their reports'
+
+    def dismiss(self, request, queryset):
+        closed = moderation.close(queryset, 'dismissed')
+        self.message_user(request, f"Dismissed {closed} items.")
+    dismiss.short_description = 'Dismiss selected items and their reports'
 
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'order', 'post_count', 'color_preview')
@@ -117,8 +235,8 @@ class CategoryAdmin(admin.ModelAdmin):
     readonly_fields = ('color_preview',)
 
     def post_count(self, obj):
-        return obj.posts.count()
-    post_count.admin_order_field = 'posts_count'
+        return community_cache.category_post_counts().get(obj.pk, 0)
+    post_count.short_description = 'Published posts'
 
     def color_preview(self, obj):
         return format_html(
@@ -127,13 +245,12 @@ class CategoryAdmin(admin.ModelAdmin):
         )
     color_preview.short_description = 'Color'
 
-    def get_queryset(self, request):
-        return super().get_queryset(request).annotate(posts_count=Count('posts'))
-
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('truncated_content', 'post_link', 'author', 'is_edited', 'created_at')
     search_fields = ('content', 'author__username', 'post__title')
-    readonly_fields = ('edit_history_preview', 'post_link')
+    list_filter = ('is_hidden',)
+    readonly_fields = ('post_link',)
+    inlines = [CommentRevisionInline]
     list_select_related = ['author', 'post']
 
     def post_link(self, obj):
@@ -142,9 +259,15 @@ class CommentAdmin(admin.ModelAdmin):
                            obj.post.title)
     post_link.short_description = 'Post'
 
-    def edit_history_preview(self, obj):
-        return format_html('<pre>{}</pre>', json.dumps(obj.edit_history, indent=2))
-    edit_history_preview.short_description = 'Edit History'
+    def get_search_results(self, request, queryset, search_term):
+        ids = search.matching_ids('comment', search_term) if search_term else None
+        if ids is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(
+            Q(pk__in=ids) |
+            Q(author__username__icontains=search_term) |
+            Q(post__title__icontains=search_term)
+        ), False
 
     def truncated_content(self, obj): # Added this method
         return format_html('<span title="{}">{}</span>',
@@ -159,4 +282,5 @@ admin.site.register(Post, PostAdmin)
 admin.site.register(Comment, CommentAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(EventRegistration, EventRegistrationAdmin)
-admin.site.register(Report, ReportAdmin)
\ No newline at end of file
+admin.site.register(Report, ReportAdmin)
+admin.site.register(ModerationItem, ModerationItemAdmin)
\ No newline at end of file
@@ -1,8 +1,27 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.models.signals import post_migrate
+
+
+def install_search_triggers(sender, using, **kwargs):
+    from django.db import connections
+    from . import search
+    search.install(connections[using])
+
+
+def start_process(sender, **kwargs):
+    # Runs once per process, on its first request, to keep DB access out of ready()
+    request_started.disconnect(start_process, dispatch_uid='community-start-process')
+    from . import cache, scheduler, trending
+    cache.warm()
+    scheduler.arm()
+    trending.arm()
 
 
 class CommunityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'community'
     def ready(self):
-        import community.signals
\ No newline at end of file
+        import community.signals
+        post_migrate.connect(install_search_triggers, sender=self)
+        request_started.connect(start_process, dispatch_uid='community-start-process')
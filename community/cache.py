@@ -0,0 +1,107 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db.models import Count
+
+PREFIX = 'community'
+
+
+def key(*parts):
+    return ':'.join([PREFIX] + [str(part) for part in parts])
+
+
+def _new_generation():
+    # Random rather than a counter: if a generation key is evicted, its
+    # replacement can't repeat a value that old entries and ETags were built on
+    return uuid.uuid4().hex
+
+
+# Generations are also kept in process memory for this many seconds, so each
+# is read from the shared cache at most once per interval; a bump made by
+# another process is seen at most this late.
+LOCAL_GENERATION_TTL = 1
+
+_generations = {}
+
+
+def version(name):
+    """Current generation of a cached namespace; bump() invalidates it."""
+    now = time.monotonic()
+    local = _generations.get(name)
+    if local and local[1] > now:
+        return local[0]
+    current = cache.get(key('version', name))
+    if current is None:
+        generation = _new_generation()
+        cache.add(key('version', name), generation, None)
+        # Another process may have won the add()
+        current = cache.get(key('version', name), generation)
+    _generations[name] = (current, now + LOCAL_GENERATION_TTL)
+    return current
+
+
+def bump(*names):
+    """Invalidate everything cached under the given namespaces."""
+    generations = {name: _new_generation() for name in names}
+    cache.set_many({key('version', name): generation for name, generation in generations.items()}, None)
+    expires = time.monotonic() + LOCAL_GENERATION_TTL
+    _generations.update({name: (generation, expires) for name, generation in generations.items()})
+
+
+_local = {}
+
+
+def cached(name, build, timeout=None):
+    """Two-tier cache: process memory, then the shared cache, then build().
+
+    Both tiers are keyed by the namespace generation, so bump(name) drops
+    them everywhere at once.
+    """
+    generation = version(name)
+    now = time.monotonic()
+    local = _local.get(name)
+    if local and local[0] == generation and (local[2] is None or local[2] > now):
+        return local[1]
+    value = cache.get(key(name, generation))
+    if value is None:
+        value = build()
+        cache.set(key(name, generation), value, timeout)
+    _local[name] = (generation, value, now + timeout if timeout else None)
+    return value
+
+
+def categories():
+    """Serialized category list, as served by the categories endpoint."""
+    from .models import Category
+    from .serializers import CategorySerializer
+    return cached(
+        'community.category',
+        lambda: [dict(item) for item in CategorySerializer(Category.objects.all(), many=True).data],
+    )
+
+
+def category_post_counts():
+    """{category_id: number of published posts}, from one GROUP BY query."""
+    from .models import Post
+    return cached(
+        'community.category-counts',
+        lambda: dict(
+            Post.objects.published().filter(category__isnull=False)
+            .order_by().values_list('category_id').annotate(total=Count('pk'))
+        ),
+    )
+
+
+def upcoming_event_dates():
+    """Sorted dates of events still marked upcoming, swept or not."""
+    from .models import Event
+    return cached(
+        'community.event',
+        lambda: sorted(Event.objects.filter(status='upcoming').values_list('event_date', flat=True)),
+    )
+
+
+def warm():
+    categories()
+    category_post_counts()
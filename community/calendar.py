@@ -0,0 +1,114 @@
+"""iCalendar (RFC 5545) export of events.
+
+Feeds are generated line by line from a queryset iterator, so a calendar of
+any size is streamed in constant memory. Calendar apps can't send an
+Authorization header, so a user's feed can also be opened with a signed
+token from feed_token(). Tokens carry the user's calendar_token_version, so
+rotate_token() revokes every URL handed out before, and expire after
+COMMUNITY_CALENDAR_TOKEN_MAX_AGE seconds when that is set.
+"""
+from datetime import timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F
+from rest_framework.renderers import BaseRenderer
+
+CHUNK_SIZE = 500
+TOKEN_SALT = 'community.calendar'
+PRODID = '-//Psycflo//Community Events//EN'
+
+
+class ICalendarRenderer(BaseRenderer):
+    """Lets ?format=ics and the .ics suffix select the calendar feeds.
+
+    The feeds stream their own responses; this only renders errors.
+    """
+    media_type = 'text/calendar'
+    format = 'ics'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return str(data or '').encode(self.charset)
+
+
+def _token_version(user_id):
+    from .models import UserProfile
+    return UserProfile.objects.filter(user_id=user_id).values_list('calendar_token_version', flat=True).first()
+
+
+def feed_token(user):
+    return signing.dumps([user.pk, _token_version(user.pk) or 0], salt=TOKEN_SALT, compress=True)
+
+
+def rotate_token(user):
+    """Revoke the user's feed tokens and return a new one."""
+    from .models import UserProfile
+    UserProfile.objects.filter(user_id=user.pk).update(calendar_token_version=F('calendar_token_version') + 1)
+    return feed_token(user)
+
+
+def user_id_from_token(token):
+    """The user a token was issued to, or None if it is invalid, expired or revoked."""
+    max_age = getattr(settings, 'COMMUNITY_CALENDAR_TOKEN_MAX_AGE', None)
+    try:
+        user_id, version = signing.loads(token, salt=TOKEN_SALT, max_age=max_age)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if _token_version(user_id) != version:
+        return None
+    return user_id
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+        .replace('\r\n', '\\n').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Split a content line into 75-octet pieces without breaking UTF-8 characters."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces, start, limit = [], 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        pieces.append(encoded[start:end].decode('utf-8'))
+        start, limit = end, 74  # continuation lines start with a space
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def _timestamp(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def vevent(event, host):
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@{host}',
+        f'DTSTAMP:{_timestamp(event.updated_at)}',
+        f'DTSTART:{_timestamp(event.event_date)}',
+        f'SUMMARY:{_escape(event.title)}',
+        f'DESCRIPTION:{_escape(event.description)}',
+    ]
+    if event.location:
+        lines.append(f'LOCATION:{_escape(event.location)}')
+    lines.append('END:VEVENT')
+    return ''.join(_fold(line) for line in lines)
+
+
+def stream(events, name, host):
+    """Yield an iCalendar document for `events`, a chunk at a time."""
+    yield ''.join(_fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN', f'X-WR-CALNAME:{_escape(name)}',
+    ))
+    for event in events.iterator(chunk_size=CHUNK_SIZE):
+        yield vevent(event, host)
+    yield 'END:VCALENDAR\r\n'
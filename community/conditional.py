@@ -0,0 +1,126 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import cache as community_cache
+
+VALIDATOR_TIMEOUT = 300
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified support for list and retrieve.
+
+    A list page is validated by the ids and updated_at of its own rows, a
+    detail by the object's updated_at, each combined with the model's cache
+    generation so changes that don't touch updated_at (counter updates,
+    comments) still produce a new ETag. Page validators are cached per URL
+    until the generation is bumped by the model signals, so a matching
+    If-None-Match costs no queries; otherwise the validator comes from the
+    page query the response needs anyway. A 304 is returned before anything
+    is serialized. list_validator() validates a whole selection instead, for
+    feeds that stream all of it.
+
+    Set per_user_representation when the payload depends on request.user.
+    """
+    per_user_representation = False
+
+    def validator_namespace(self):
+        return self.get_queryset().model._meta.label_lower
+
+    def _validator_scope(self, request):
+        generation = community_cache.version(self.validator_namespace())
+        user = request.user.pk if self.per_user_representation and request.user.is_authenticated else ''
+        return f'{generation}:{user}'
+
+    def _validator_key(self, request, scope):
+        return community_cache.key(
+            'validator', self.validator_namespace(), scope,
+            hashlib.md5(request.get_full_path().encode()).hexdigest(),
+        )
+
+    def list_validator(self, request):
+        scope = self._validator_scope(request)
+        cache_key = self._validator_key(request, scope)
+        etag = cache.get(cache_key)
+        if etag is None:
+            summary = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+                last=Max('updated_at'), total=Count('pk')
+            )
+            etag = self._etag(scope, summary['last'], summary['total'], request.get_full_path())
+            cache.set(cache_key, etag, VALIDATOR_TIMEOUT)
+        return etag, None
+
+    def page_validator(self, request, scope, rows):
+        return self._etag(
+            scope, request.get_full_path(), *[f'{row.pk}@{row.updated_at}' for row in rows]
+        ), None
+
+    def detail_validator(self, request, updated_at):
+        scope = self._validator_scope(request)
+        return self._etag(scope, updated_at, request.get_full_path()), updated_at
+
+    def _etag(self, *parts):
+        digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+        return 'W/' + quote_etag(digest)
+
+    def not_modified(self, request, validator):
+        etag, last_modified = validator
+        return get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+
+    def with_validator(self, response, validator):
+        etag, last_modified = validator
+        response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        if self.per_user_representation:
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def conditional(self, request, validator, respond):
+        """Answer 304 when the client's copy is current, otherwise call respond()."""
+        response = self.not_modified(request, validator) or respond()
+        return self.with_validator(response, validator)
+
+    def list(self, request, *args, **kwargs):
+        scope = self._validator_scope(request)
+        cache_key = self._validator_key(request, scope)
+        etag = cache.get(cache_key)
+        if etag is not None:
+            response = self.not_modified(request, (etag, None))
+            if response is not None:
+                return self.with_validator(response, (etag, None))
+
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset if page is None else page)
+        validator = self.page_validator(request, scope, rows)
+        cache.set(cache_key, validator[0], VALIDATOR_TIMEOUT)
+
+        def respond():
+            data = self.get_serializer(rows, many=True).data
+            return Response(data) if page is None else self.get_paginated_response(data)
+        return self.conditional(request, validator, respond)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            updated_at = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            updated_at = None
+        if updated_at is None:
+            return super().retrieve(request, *args, **kwargs)  # Let it 404
+        return self.conditional(
+            request, self.detail_validator(request, updated_at),
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs),
+        )
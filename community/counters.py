@@ -0,0 +1,84 @@
+import atexit
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+
+class PostCounterBuffer:
+    """Write-behind accumulator for hot post counters (views, shares).
+
+    Increments are summed in memory per post and applied to the database in
+    one batched UPDATE by flush(). A flush happens when the buffer holds
+    `max_pending` increments, when a timer armed on the first pending
+    increment fires after `flush_interval` seconds, or at interpreter exit.
+    A flush_interval of 0 makes the buffer write-through.
+    """
+
+    def __init__(self, flush_interval=None, max_pending=None, use_timer=True):
+        self._flush_interval = flush_interval
+        self._max_pending = max_pending
+        self._use_timer = use_timer
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._pending_total = 0
+        self._timer = None
+
+    @property
+    def flush_interval(self):
+        if self._flush_interval is not None:
+            return self._flush_interval
+        return getattr(settings, 'COMMUNITY_COUNTER_FLUSH_INTERVAL', 5)
+
+    @property
+    def max_pending(self):
+        if self._max_pending is not None:
+            return self._max_pending
+        return getattr(settings, 'COMMUNITY_COUNTER_MAX_PENDING', 1000)
+
+    def incr(self, post_id, field, amount=1):
+        """Record `amount` more for `field` on a post without touching the DB."""
+        with self._lock:
+            self._pending[post_id][field] += amount
+            self._pending_total += amount
+            due = not self.flush_interval or self._pending_total >= self.max_pending
+            if not due and self._use_timer and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if due:
+            self.flush()
+
+    def pending(self, post_id, field):
+        """Increments recorded for a post that have not been flushed yet."""
+        with self._lock:
+            changes = self._pending.get(post_id)
+            return changes.get(field, 0) if changes else 0
+
+    def flush(self):
+        """Apply all pending increments; returns the number of posts updated."""
+        with self._lock:
+            pending = {pk: dict(changes) for pk, changes in self._pending.items()}
+            self._pending.clear()
+            self._pending_total = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+        from .models import Post
+        return Post.objects.increment(pending)
+
+    def _timed_flush(self):
+        with self._lock:
+            self._timer = None
+        try:
+            self.flush()
+        finally:
+            # The timer thread owns its own connection; don't leak it.
+            connections.close_all()
+
+
+post_counters = PostCounterBuffer()
+atexit.register(post_counters.flush)
@@ -0,0 +1,165 @@
+"""Personalized home feed of posts from followed categories.
+
+New posts are pushed into each subscriber's TimelineEntry rows when they go
+live (fan-out on write), so reading a page is one index range scan on
+(user, -published_at). Categories with more than COMMUNITY_FEED_FANOUT_LIMIT
+subscribers are not fanned out; their posts are merged in at read time from
+the posts table instead (fan-out on read). Timelines are trimmed to
+COMMUNITY_FEED_TIMELINE_SIZE entries per user by trim().
+"""
+import base64
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When, Window
+from django.db.models.functions import RowNumber
+from django.utils.dateparse import parse_datetime
+
+from .models import Category, CategorySubscription, Post, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+# When a post went live: its scheduled time, unless it was created after that
+PUBLISHED_AT = Case(
+    When(scheduled_publish_time__gt=F('created_at'), then=F('scheduled_publish_time')),
+    default=F('created_at'),
+)
+
+
+def published_at(post):
+    """PUBLISHED_AT for a loaded post"""
+    if post.scheduled_publish_time and post.scheduled_publish_time > post.created_at:
+        return post.scheduled_publish_time
+    return post.created_at
+
+
+def fanout_limit():
+    return getattr(settings, 'COMMUNITY_FEED_FANOUT_LIMIT', 5000)
+
+
+def timeline_size():
+    return getattr(settings, 'COMMUNITY_FEED_TIMELINE_SIZE', 500)
+
+
+def fan_out(post):
+    """Push a live post into the timelines of its category's subscribers."""
+    if not post.category_id or not post.is_published:
+        return 0
+    subscribers = Category.objects.filter(pk=post.category_id).values_list('subscribers_count', flat=True).first()
+    if not subscribers or subscribers > fanout_limit():
+        return 0
+    user_ids = (
+        CategorySubscription.objects.filter(category_id=post.category_id)
+        .values_list('user_id', flat=True).iterator(chunk_size=BATCH_SIZE)
+    )
+    created, batch = 0, []
+    for user_id in user_ids:
+        batch.append(TimelineEntry(user_id=user_id, post_id=post.pk, published_at=published_at(post)))
+        if len(batch) >= BATCH_SIZE:
+            created += len(TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True))
+            batch = []
+    created += len(TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True))
+    return created
+
+
+def subscribe(user, category):
+    """Follow a category and seed the timeline with its recent posts."""
+    with transaction.atomic():
+        _, created = CategorySubscription.objects.get_or_create(user=user, category=category)
+        if not created:
+            return False
+        Category.objects.filter(pk=category.pk).update(subscribers_count=F('subscribers_count') + 1)
+        recent = (
+            Post.objects.published().filter(category=category).annotate(published_at=PUBLISHED_AT)
+            .order_by('-published_at', '-id').values_list('pk', 'published_at')[:timeline_size()]
+        )
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=user, post_id=pk, published_at=when) for pk, when in recent],
+            ignore_conflicts=True,
+        )
+    return True
+
+
+def unsubscribe(user, category):
+    with transaction.atomic():
+        deleted, _ = CategorySubscription.objects.filter(user=user, category=category).delete()
+        if not deleted:
+            return False
+        Category.objects.filter(pk=category.pk).update(subscribers_count=F('subscribers_count') - 1)
+        TimelineEntry.objects.filter(user=user, post__category=category).delete()
+    return True
+
+
+def encode_cursor(published_at, post_id):
+    return base64.urlsafe_b64encode(f'{published_at.isoformat()}|{post_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        published_at, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        published_at = parse_datetime(published_at)
+        post_id = int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid feed cursor")
+    if published_at is None:
+        raise ValueError("Invalid feed cursor")
+    return published_at, post_id
+
+
+def _before(published_at_field, id_field, cursor):
+    published_at, post_id = cursor
+    return Q(**{f'{published_at_field}__lt': published_at}) | Q(
+        **{published_at_field: published_at, f'{id_field}__lt': post_id}
+    )
+
+
+def page(user, cursor=None, limit=20):
+    """One page of a user's feed: (posts, next_cursor or None).
+
+    `cursor` is a decoded (published_at, post_id) position; the page holds
+    posts strictly older than it.
+    """
+    pushed = TimelineEntry.objects.filter(user=user)
+    if cursor:
+        pushed = pushed.filter(_before('published_at', 'post_id', cursor))
+    candidates = list(
+        pushed.order_by('-published_at', '-post_id').values_list('published_at', 'post_id')[:limit + 1]
+    )
+
+    large = list(
+        CategorySubscription.objects.filter(
+            user=user, category__subscribers_count__gt=fanout_limit()
+        ).values_list('category_id', flat=True)
+    )
+    if large:
+        pulled = Post.objects.published().filter(category_id__in=large).annotate(published_at=PUBLISHED_AT)
+        if cursor:
+            pulled = pulled.filter(_before('published_at', 'id', cursor))
+        candidates += list(
+            pulled.order_by('-published_at', '-id').values_list('published_at', 'id')[:limit + 1]
+        )
+
+    candidates = sorted(set(candidates), reverse=True)[:limit + 1]
+    next_cursor = None
+    if len(candidates) > limit:
+        candidates = candidates[:limit]
+        next_cursor = encode_cursor(*candidates[-1])
+
+    # Posts may have been unpublished since they were pushed
+    posts = Post.objects.published().select_related('author__profile', 'category').in_bulk(
+        [post_id for _, post_id in candidates]
+    )
+    return [posts[post_id] for _, post_id in candidates if post_id in posts], next_cursor
+
+
+def trim():
+    """Cut every timeline down to its newest entries in one set-based DELETE."""
+    overflow = TimelineEntry.objects.annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('user_id')],
+            order_by=[F('published_at').desc(), F('post_id').desc()],
+        )
+    ).filter(position__gt=timeline_size()).values('pk')
+    return TimelineEntry.objects.filter(pk__in=overflow).delete()[0]
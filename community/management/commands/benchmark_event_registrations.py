@@ -0,0 +1,93 @@
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from community.models import Event, EventRegistration, User, UserProfile
+
+
+class Command(BaseCommand):
+    help = (
+        "Register thousands of users for one event concurrently, comparing the "
+        "seat counter with the old SELECT ... FOR UPDATE registration"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help="Simultaneous registrations")
+        parser.add_argument('--capacity', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=32, help="Concurrent threads")
+
+    def handle(self, *args, **options):
+        # Threads need to see each other's writes, so the data is committed
+        # and deleted again at the end.
+        if connection.vendor == 'sqlite':
+            self.stdout.write("note: SQLite allows one writer at a time; run against PostgreSQL for real numbers")
+        User.objects.bulk_create(
+            [User(username=f'benchmark-registrant-{i}') for i in range(options['users'])]
+        )
+        user_ids = [user.pk for user in User.objects.filter(username__startswith='benchmark-registrant-')]
+        UserProfile.objects.provision(user_ids)
+        try:
+            for label, register in (('row lock', self._locked), ('seat counter', self._counter)):
+                event = Event.objects.create(
+                    title=f"Benchmark event ({label})",
+                    slug=f"benchmark-event-registrations-{label.replace(' ', '-')}",
+                    description="x" * 50,
+                    status='upcoming',
+                    event_date=timezone.now() + timedelta(days=30),
+                    capacity=options['capacity'],
+                )
+                try:
+                    elapsed, outcomes = self._run(event.pk, user_ids, register, options['workers'])
+                    registered = EventRegistration.objects.filter(
+                        event=event, status=EventRegistration.CONFIRMED
+                    ).count()
+                    event.refresh_from_db()
+                    self.stdout.write(
+                        f"{label:>12}: {len(user_ids)} registrations in {elapsed:.3f}s "
+                        f"({len(user_ids) / elapsed:,.0f}/s) {dict(outcomes)}; "
+                        f"{registered}/{event.capacity} registered, seats_taken={event.seats_taken}"
+                    )
+                finally:
+                    event.delete()
+        finally:
+            User.objects.filter(pk__in=user_ids).delete()
+
+    def _run(self, event_id, user_ids, register, workers):
+        def attempt(user_id):
+            try:
+                return register(event_id, user_id)
+            except OperationalError:
+                return 'error'
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = Counter(pool.map(attempt, user_ids))
+        return time.perf_counter() - start, outcomes
+
+    def _locked(self, event_id, user_id):
+        # What EventViewSet.register used to do
+        with transaction.atomic():
+            event = Event.objects.select_for_update().get(pk=event_id)
+            if event.capacity - event.registrations.count() <= 0:
+                return 'full'
+            if EventRegistration.objects.filter(event_id=event_id, user_id=user_id).exists():
+                return 'duplicate'
+            EventRegistration.objects.bulk_create([EventRegistration(event_id=event_id, user_id=user_id)])
+        return 'registered'
+
+    def _counter(self, event_id, user_id):
+        if EventRegistration.objects.filter(event_id=event_id, user_id=user_id).exists():
+            return 'duplicate'
+        try:
+            with transaction.atomic():
+                registration = EventRegistration.objects.create(event_id=event_id, user_id=user_id)
+        except IntegrityError:
+            return 'duplicate'
+        return 'registered' if registration.status == EventRegistration.CONFIRMED else 'waitlisted'
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from community.models import Event
+
+
+class Command(BaseCommand):
+    help = "Compare re-saving due events one by one with the set-based past-event sweep"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20000)
+        parser.add_argument('--due', type=float, default=0.5, help="Fraction of events already past")
+
+    def handle(self, *args, **options):
+        total = options['events']
+        due = int(total * options['due'])
+        now = timezone.now()
+        # Everything runs inside a transaction that is rolled back at the end.
+        with transaction.atomic():
+            for label, sweep in (('per-row save', self._save_each), ('bulk sweep', Event.objects.sweep_past)):
+                sid = transaction.savepoint()
+                self._create(total, due, now)
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    sweep()
+                    elapsed = time.perf_counter() - start
+                remaining = Event.objects.filter(status='upcoming', event_date__lt=now).count()
+                self.stdout.write(
+                    f"{label:>12}: {due} of {total} events due, {elapsed * 1000:.1f} ms, "
+                    f"{len(ctx.captured_queries)} queries, {remaining} left unswept"
+                )
+                transaction.savepoint_rollback(sid)
+
+            self._create(total, due, now)
+            start = time.perf_counter()
+            upcoming = len(Event.objects.upcoming()[:100])
+            past = Event.objects.past().count()
+            self.stdout.write(
+                f"{'unswept':>12}: first {upcoming} upcoming and {past} past by effective "
+                f"status in {(time.perf_counter() - start) * 1000:.1f} ms"
+            )
+            transaction.set_rollback(True)
+
+    def _create(self, total, due, now):
+        """`total` upcoming events, the first `due` of them already in the past"""
+        Event.objects.bulk_create([
+            Event(
+                title=f"Benchmark event {i}",
+                slug=f"benchmark-event-sweep-{i}",
+                description="x" * 50,
+                status='upcoming',
+                event_date=now + timedelta(hours=i - due + 1),
+            )
+            for i in range(total)
+        ], batch_size=1000)
+
+    def _save_each(self):
+        # What happened before: status only changed when an event was re-saved
+        for event in Event.objects.filter(status='upcoming', event_date__lt=timezone.now()):
+            event.save()
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from community.counters import PostCounterBuffer
+from community.models import Post
+
+
+class Command(BaseCommand):
+    help = "Compare DB writes per second for post view counting with and without the counter buffer"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--views', type=int, default=5000, help="Simulated post views")
+        parser.add_argument('--posts', type=int, default=10, help="Number of hot posts")
+        parser.add_argument('--batch', type=int, default=1000, help="Buffer flush threshold")
+
+    def handle(self, *args, **options):
+        views, batch = options['views'], options['batch']
+        # Everything runs inside a transaction that is rolled back at the end.
+        with transaction.atomic():
+            posts = [
+                Post.objects.create(
+                    title=f"Benchmark post {i}",
+                    slug=f"benchmark-post-counters-{i}",
+                    content="x" * 50,
+                )
+                for i in range(options['posts'])
+            ]
+
+            direct = self._run(posts, views, self._direct_view)
+            buffer = PostCounterBuffer(flush_interval=3600, max_pending=batch, use_timer=False)
+            buffered = self._run(posts, views, lambda post: buffer.incr(post.pk, 'views'), buffer.flush)
+
+            expected = 2 * views
+            total = sum(Post.objects.filter(pk__in=[p.pk for p in posts]).values_list('views', flat=True))
+            transaction.set_rollback(True)
+
+        for label, (elapsed, writes) in (('direct save', direct), ('buffered', buffered)):
+            self.stdout.write(
+                f"{label:>12}: {views} views in {elapsed:.3f}s, {writes} UPDATEs "
+                f"({views / elapsed:,.0f} views/s, {writes / elapsed:,.0f} writes/s)"
+            )
+        self.stdout.write(f"views recorded: {total}/{expected}")
+
+    def _direct_view(self, post):
+        post.refresh_from_db(fields=['views', 'engagement_score'])
+        post.views += 1
+        post.engagement_score += Post.ENGAGEMENT_WEIGHTS['views']
+        Post.objects.filter(pk=post.pk).update(views=post.views, engagement_score=post.engagement_score)
+
+    def _run(self, posts, views, view, finish=None):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for i in range(views):
+                view(posts[i % len(posts)])
+            if finish:
+                finish()
+            elapsed = time.perf_counter() - start
+        writes = sum(1 for q in ctx.captured_queries if q['sql'].startswith('UPDATE'))
+        return elapsed, writes
@@ -0,0 +1,59 @@
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from community.trending import DECAY_SECONDS, EPOCH, Leaderboard
+
+
+class Command(BaseCommand):
+    help = "Benchmark the trending leaderboard against sorting every post, on synthetic data"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--updates', type=int, default=100_000)
+        parser.add_argument('--limit', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        now = EPOCH + 365 * 86400
+        posts = {}
+        for pk in range(1, options['posts'] + 1):
+            created = now - rng.randint(0, 90 * 86400)
+            engagement = int(rng.paretovariate(1.2))
+            posts[pk] = [rng.randrange(options['categories']), created, engagement]
+
+        def score(pk):
+            _, created, engagement = posts[pk]
+            return round(math.log10(max(engagement, 1)) + (created - EPOCH) / DECAY_SECONDS, 7)
+
+        start = time.perf_counter()
+        board = Leaderboard.build(((pk, score(pk)) for pk in posts), size=200)
+        self._report("build top-200 from all posts", time.perf_counter() - start)
+
+        hot = board.top(200) + rng.sample(range(1, len(posts) + 1), 1000)
+        start = time.perf_counter()
+        for _ in range(options['updates']):
+            pk = rng.choice(hot)
+            posts[pk][2] += rng.choice((1, 1, 1, 2, 3))
+            board.update(pk, score(pk))
+        elapsed = time.perf_counter() - start
+        self._report(f"{options['updates']} incremental updates", elapsed,
+                     f"{options['updates'] / elapsed:,.0f} updates/s")
+
+        limit = options['limit']
+        start = time.perf_counter()
+        for _ in range(1000):
+            served = board.top(limit)
+        self._report(f"serve top-{limit} from leaderboard (x1000)", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        expected = sorted(posts, key=lambda pk: (score(pk), pk), reverse=True)[:limit]
+        self._report(f"full sort of {len(posts)} posts (x1)", time.perf_counter() - start)
+
+        self.stdout.write(f"leaderboard matches full sort: {served == expected}")
+
+    def _report(self, label, elapsed, extra=''):
+        self.stdout.write(f"{label:>40}: {elapsed * 1000:10.1f} ms {extra}")
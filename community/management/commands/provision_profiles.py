@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from community.models import User, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Create the missing profiles of users that were inserted in bulk"
+
+    def handle(self, *args, **options):
+        created = UserProfile.objects.provision(
+            User.objects.filter(profile__isnull=True).values_list('pk', flat=True)
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {created} profiles"))
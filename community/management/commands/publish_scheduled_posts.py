@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from community import scheduler
+
+
+class Command(BaseCommand):
+    help = "Make scheduled posts whose publish time has passed live"
+
+    def handle(self, *args, **options):
+        post_ids = scheduler.publish_due_posts()
+        self.stdout.write(self.style.SUCCESS(f"Published {len(post_ids)} scheduled posts"))
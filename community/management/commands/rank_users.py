@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from community import ranking
+
+
+class Command(BaseCommand):
+    help = "Rescore users whose activity changed since the last run and re-rank everyone (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help="Rescore every user, not just the changed ones")
+
+    def handle(self, *args, **options):
+        rescored, reranked = ranking.run(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Rescored {rescored} users, {reranked} ranks changed"))
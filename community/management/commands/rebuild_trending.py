@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from community import trending
+
+
+class Command(BaseCommand):
+    help = "Rebuild the trending post leaderboards from the database"
+
+    def handle(self, *args, **options):
+        boards = trending.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(boards)} trending leaderboards"))
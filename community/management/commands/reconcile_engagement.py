@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from community.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute post like/comment counters and engagement scores from the source tables"
+
+    def handle(self, *args, **options):
+        updated = Post.objects.reconcile_counters()
+        self.stdout.write(self.style.SUCCESS(f"Reconciled engagement for {updated} posts"))
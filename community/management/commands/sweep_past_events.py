@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from community import cache
+from community.models import Event
+
+
+class Command(BaseCommand):
+    help = "Mark every event whose date has passed as past, in one UPDATE (run from cron)"
+
+    def handle(self, *args, **options):
+        swept = Event.objects.sweep_past()
+        if swept:
+            cache.bump('community.event')
+        self.stdout.write(self.style.SUCCESS(f"Marked {swept} events as past"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from community import feed
+
+
+class Command(BaseCommand):
+    help = "Trim every home feed timeline to its newest entries"
+
+    def handle(self, *args, **options):
+        deleted = feed.trim()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} timeline entries"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from community import cache
+
+
+class Command(BaseCommand):
+    help = "Fill the shared cache with the category list and post counts"
+
+    def handle(self, *args, **options):
+        cache.warm()
+        self.stdout.write(self.style.SUCCESS("Community cache warmed"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-18 09:07
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('community', 'Post')
+    Comment = apps.get_model('community', 'Comment')
+    likes = Coalesce(Subquery(
+        Post.likes.through.objects.filter(post_id=OuterRef('pk'))
+        .values('post_id').annotate(total=Count('*')).values('total')
+    ), 0)
+    comments = Coalesce(Subquery(
+        Comment.objects.filter(post_id=OuterRef('pk'))
+        .values('post_id').annotate(total=Count('*')).values('total')
+    ), 0)
+    Post.objects.update(
+        likes_count=likes,
+        comments_count=comments,
+        engagement_score=likes * 2 + comments + F('views') + F('shares') * 3,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 09:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+
+
+def backfill_paths(apps, schema_editor):
+    """Fill path/depth one tree level at a time with set-based UPDATEs."""
+    Comment = apps.get_model('community', 'Comment')
+    segment = LPad(Cast('id', CharField()), 10, Value('0'))
+    Comment.objects.filter(parent_comment__isnull=True).update(depth=0, path=segment)
+    parent_path = Subquery(Comment.objects.filter(pk=OuterRef('parent_comment_id')).values('path')[:1])
+    depth = 0
+    while True:
+        parents = Comment.objects.filter(depth=depth).exclude(path='')
+        updated = Comment.objects.filter(path='', parent_comment__in=parents).update(
+            depth=depth + 1,
+            path=Concat(parent_path, segment, output_field=CharField()),
+        )
+        if not updated:
+            break
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0002_post_likes_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='community_c_post_id_a98548_idx'),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
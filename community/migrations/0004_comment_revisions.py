@@ -0,0 +1,72 @@
+# Generated by Django 5.2 on 2026-10-18 09:11
+
+import difflib
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+
+
+
+def make_diff(new, old):
+    """Frozen copy of community.revisions.make_diff at the time of writing."""
+    matcher = difflib.SequenceMatcher(None, new, old, autojunk=False)
+    return [
+        [i1, i2, old[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def drain_edit_history(apps, schema_editor):
+    """Turn each comment's edit_history array into CommentRevision rows."""
+    Comment = apps.get_model('community', 'Comment')
+    CommentRevision = apps.get_model('community', 'CommentRevision')
+    batch = []
+    comments = Comment.objects.exclude(edit_history=[]).values_list('pk', 'content', 'edit_history')
+    for pk, content, edit_history in comments.iterator(chunk_size=500):
+        # Entries are oldest first; each edit produced the next entry's
+        # previous_content, and the last one produced the current content.
+        edited_texts = [entry['previous_content'] for entry in edit_history[1:]] + [content]
+        for entry, edited in zip(edit_history, edited_texts):
+            if edited == entry['previous_content']:
+                # Saves that logged an entry without changing the text
+                continue
+            batch.append(CommentRevision(
+                comment_id=pk,
+                diff=make_diff(edited, entry['previous_content']),
+                edited_at=parse_datetime(entry['edited_at']),
+            ))
+        if len(batch) >= 1000:
+            CommentRevision.objects.bulk_create(batch)
+            batch = []
+    CommentRevision.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0003_comment_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommentRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('diff', models.JSONField(help_text='Reverse diff from the edited text to the previous text')),
+                ('edited_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='community.comment')),
+            ],
+            options={
+                'ordering': ['-edited_at', '-id'],
+                'indexes': [models.Index(fields=['comment', '-edited_at'], name='community_c_comment_5a36d9_idx')],
+            },
+        ),
+        migrations.RunPython(drain_edit_history, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='comment',
+            name='edit_history',
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from community import search
+
+
+def install_search_index(apps, schema_editor):
+    search.install(schema_editor.connection, backfill=True)
+
+
+def remove_search_index(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0004_comment_revisions'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
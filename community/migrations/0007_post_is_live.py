@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 09:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def backfill_is_live(apps, schema_editor):
+    Post = apps.get_model('community', 'Post')
+    Post.objects.filter(is_draft=False).filter(
+        Q(scheduled_publish_time__isnull=True) | Q(scheduled_publish_time__lte=timezone.now())
+    ).update(is_live=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0006_home_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_live',
+            field=models.BooleanField(default=False, editable=False, help_text='Published and past its scheduled time'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_live', '-created_at'], name='community_p_is_live_d07641_idx'),
+        ),
+        migrations.RunPython(backfill_is_live, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 09:19
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_seats_taken(apps, schema_editor):
+    Event = apps.get_model('community', 'Event')
+    EventRegistration = apps.get_model('community', 'EventRegistration')
+    taken = (
+        EventRegistration.objects.filter(event=OuterRef('pk'))
+        .order_by().values('event').annotate(n=Count('pk')).values('n')
+    )
+    Event.objects.update(seats_taken=Coalesce(Subquery(taken), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0007_post_is_live'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_seats_taken, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2 on 2026-10-18 09:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+PRIORITY_WEIGHTS = {'abuse': 3, 'inappropriate': 2, 'spam': 1, 'other': 1}
+
+
+def backfill_moderation_items(apps, schema_editor):
+    Report = apps.get_model('community', 'Report')
+    ModerationItem = apps.get_model('community', 'ModerationItem')
+    items = {}
+    pending = Report.objects.filter(status__in=('open', 'reviewed')).order_by('created_at', 'id')
+    for report in pending.iterator():
+        target = ('comment', report.comment_id) if report.comment_id else ('post', report.post_id)
+        item = items.setdefault(target, {'reporters': set(), 'count': 0, 'priority': 0, 'last': None})
+        item['count'] += 1
+        item['last'] = report.created_at
+        if report.reporter_id is None or report.reporter_id not in item['reporters']:
+            item['reporters'].add(report.reporter_id)
+            item['priority'] += PRIORITY_WEIGHTS.get(report.report_type, 1)
+    ModerationItem.objects.bulk_create([
+        ModerationItem(
+            **{f'{kind}_id': pk},
+            report_count=item['count'],
+            reporter_count=len(item['reporters']),
+            priority=item['priority'],
+            last_reported_at=item['last'],
+        )
+        for (kind, pk), item in items.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0010_event_date_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='report',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('reviewed', 'Reviewed'), ('resolved', 'Resolved'), ('dismissed', 'Dismissed')], default='open', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ModerationItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('resolved', 'Resolved'), ('dismissed', 'Dismissed')], default='open', max_length=20)),
+                ('report_count', models.PositiveIntegerField(default=0)),
+                ('reporter_count', models.PositiveIntegerField(default=0, help_text='Distinct reporters; repeat reports by one user count once')),
+                ('priority', models.PositiveIntegerField(default=0)),
+                ('last_reported_at', models.DateTimeField(blank=True, null=True)),
+                ('resolution_details', models.TextField(blank=True)),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='moderation_items', to='community.comment')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='moderation_items', to='community.post')),
+            ],
+            options={
+                'ordering': ['-priority', '-last_reported_at'],
+                'indexes': [models.Index(fields=['status', '-priority', '-last_reported_at'], name='community_m_status_2c0e3e_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(('post__isnull', False), ('comment__isnull', False), _connector='OR'), name='moderation_item_target_required'), models.UniqueConstraint(condition=models.Q(('comment__isnull', True)), fields=('post',), name='unique_post_moderation_item'), models.UniqueConstraint(condition=models.Q(('comment__isnull', False)), fields=('comment',), name='unique_comment_moderation_item')],
+            },
+        ),
+        migrations.RunPython(backfill_moderation_items, migrations.RunPython.noop),
+    ]
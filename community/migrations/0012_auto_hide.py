@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 09:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0011_moderation_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='post',
+            name='community_p_is_live_d07641_idx',
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='is_hidden',
+            field=models.BooleanField(default=False, help_text='Hidden by moderation, along with its replies'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='is_hidden',
+            field=models.BooleanField(default=False, help_text='Hidden by moderation, automatically once reports pass the threshold'),
+        ),
+        migrations.AlterField(
+            model_name='moderationitem',
+            name='priority',
+            field=models.PositiveIntegerField(default=0, help_text='Weighted report score; the content is hidden once it reaches COMMUNITY_AUTO_HIDE_THRESHOLD'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'is_hidden', 'path'], name='community_c_post_id_df4cbd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_live', 'is_hidden', '-created_at'], name='community_p_is_live_0e41e9_idx'),
+        ),
+    ]
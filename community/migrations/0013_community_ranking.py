@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 09:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0012_auto_hide'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='community_score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='community_rank',
+            field=models.PositiveIntegerField(default=0, help_text='Rank by community_score, set by the rank_users command; 0 until the user has a score'),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['-community_score'], name='community_u_communi_dd480d_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0013_community_ranking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='last_active',
+            field=models.DateTimeField(blank=True, help_text='Recorded by LastActiveMiddleware, at most once every COMMUNITY_ACTIVITY_INTERVAL minutes', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='userprofile',
+            index=models.Index(fields=['last_active'], name='community_u_last_ac_dd9e72_idx'),
+        ),
+    ]
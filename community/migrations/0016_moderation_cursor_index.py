@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0015_ranking_run'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moderationitem',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='community_m_status_a6db11_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0016_moderation_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='calendar_token_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text="Signed into calendar feed tokens; bumping it revokes the user's feed URLs"),
+        ),
+    ]
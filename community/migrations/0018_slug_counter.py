@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0017_userprofile_calendar_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlugCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(help_text='app_label.model_name of the slugged model', max_length=100)),
+                ('base', models.CharField(max_length=210)),
+                ('next_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('model', 'base')},
+            },
+        ),
+    ]
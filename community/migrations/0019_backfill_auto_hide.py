@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Q
+
+PRIORITY_WEIGHTS = {'abuse': 3, 'inappropriate': 2, 'spam': 1, 'other': 1}
+REPORTER_TRUST_WEIGHTS = {'verified': 3, 'pending': 1, 'unverified': 1}
+PATH_END = '~'
+
+
+def backfill_priority_and_hidden(apps, schema_editor):
+    """Recount open items with trust-weighted priorities and hide the content
+    of those at or above COMMUNITY_AUTO_HIDE_THRESHOLD, as moderation.refresh() would."""
+    Report = apps.get_model('community', 'Report')
+    ModerationItem = apps.get_model('community', 'ModerationItem')
+    Post = apps.get_model('community', 'Post')
+    Comment = apps.get_model('community', 'Comment')
+    priorities, reporters = {}, {}
+    pending = Report.objects.filter(status__in=('open', 'reviewed')).order_by('id').values_list(
+        'post_id', 'comment_id', 'reporter_id', 'report_type', 'reporter__profile__verification_status'
+    )
+    for post_id, comment_id, reporter_id, report_type, trust in pending.iterator():
+        target = ('comment', comment_id) if comment_id else ('post', post_id)
+        seen = reporters.setdefault(target, set())
+        if reporter_id and reporter_id in seen:
+            continue
+        if reporter_id:
+            seen.add(reporter_id)
+        priorities[target] = priorities.get(target, 0) + (
+            PRIORITY_WEIGHTS.get(report_type, 1) * REPORTER_TRUST_WEIGHTS.get(trust, 1)
+        )
+    items = list(ModerationItem.objects.filter(status='open'))
+    for item in items:
+        target = ('comment', item.comment_id) if item.comment_id else ('post', item.post_id)
+        item.priority = priorities.get(target, 0)
+    ModerationItem.objects.bulk_update(items, ['priority'], batch_size=1000)
+
+    threshold = getattr(settings, 'COMMUNITY_AUTO_HIDE_THRESHOLD', 10)
+    if not threshold:
+        return
+    over = [item for item in items if item.priority >= threshold]
+    Post.objects.filter(pk__in=[item.post_id for item in over if not item.comment_id]).update(is_hidden=True)
+    subtrees = Q()
+    for post_id, path in Comment.objects.filter(
+        pk__in=[item.comment_id for item in over if item.comment_id]
+    ).values_list('post_id', 'path'):
+        subtrees |= Q(post_id=post_id, path__gte=path, path__lt=path + PATH_END)
+    if subtrees:
+        Comment.objects.filter(subtrees).update(is_hidden=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0018_slug_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_priority_and_hidden, migrations.RunPython.noop),
+    ]
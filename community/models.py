@@ -1,11 +1,15 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinLengthValidator
-from django.utils.text import slugify
 from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal
 from django.core.exceptions import ValidationError
-from django.db.models import Count, F
+from django.db.models import Count, F, Case, When, Value, IntegerField, OuterRef, Subquery
+from django.db.models import Window
+from django.db.models.functions import Coalesce, RowNumber
+from .revisions import make_diff
+from . import slugs
 
 class TimestampMixin(models.Model):
     """Base model with automatic timestamp tracking"""
@@ -15,7 +19,67 @@ class TimestampMixin(models.Model):
     class Meta:
         abstract = True
 
-class Category(TimestampMixin):
+class CounterFieldsMixin:
+    """Keeps counter columns that are maintained by F() UPDATEs out of
+    full-row saves of existing rows.
+
+    Otherwise saving an instance (admin, API PUT/PATCH) writes back the
+    counter values it was loaded with and undoes every concurrent change.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        return super().save(*args, **kwargs)
+
+class SlugMixin:
+    """Fills in a unique slug from slug_source_field when a row is saved without one.
+
+    The allocation query runs before the INSERT; if a concurrent insert wins
+    the slug anyway, the save is retried in a savepoint with a new one.
+    """
+    slug_source_field = 'title'
+    SLUG_ATTEMPTS = 3
+
+    def slug_source(self):
+        return getattr(self, self.slug_source_field)
+
+    def slug_needs_update(self):
+        return not self.slug
+
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is not None or not self.slug_needs_update():
+            return super().save(*args, **kwargs)
+        for attempt in range(self.SLUG_ATTEMPTS):
+            self.slug = slugs.allocate(self, self.slug_source())
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = type(self)._default_manager.filter(slug=self.slug).exclude(pk=self.pk).exists()
+                if not taken or attempt == self.SLUG_ATTEMPTS - 1:
+                    raise
+
+class SlugCounter(models.Model):
+    """Next "-N" suffix of one slug base, so suffixes of deleted rows aren't reused"""
+    model = models.CharField(max_length=100, help_text="app_label.model_name of the slugged model")
+    base = models.CharField(max_length=210)
+    next_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('model', 'base')
+
+    def __str__(self):
+        return f"{self.model} {self.base}-{self.next_number}"
+
+class Category(SlugMixin, CounterFieldsMixin, TimestampMixin):
     """Manages discussion categories visible in UI"""
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=110, unique=True, blank=True)
@@ -37,6 +101,9 @@ class Category(TimestampMixin):
         default=0,
         help_text="Display order in category list"
     )
+    subscribers_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('subscribers_count',)
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -46,12 +113,116 @@ class Category(TimestampMixin):
     def __str__(self):
         return f"{self.name} Category"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._original_name = self.__dict__.get('name')
+
+    slug_source_field = 'name'
+
+    def slug_needs_update(self):
+        return not self.slug or (self.pk and self._original_name != self.name)
+
     def clean(self):
         """Automatically generate/update slug from name"""
-        if not self.slug or (self.pk and Category.objects.get(pk=self.pk).name != self.name):
-            self.slug = slugify(self.name)
+        if self.slug_needs_update():
+            self.slug = slugs.allocate(self, self.name)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._original_name = self.name
+
+class CategorySubscription(TimestampMixin):
+    """A user following a category in their home feed"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='category_subscriptions'
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='subscriptions'
+    )
+
+    class Meta:
+        unique_together = ('user', 'category')
+
+    def __str__(self):
+        return f"{self.user} follows {self.category}"
+
+class EventManager(models.Manager):
+    def reserve_seat(self, event_id):
+        """Take one seat with a conditional UPDATE; False when the event is full.
+
+        The row lock is taken by the UPDATE itself rather than an up-front
+        SELECT ... FOR UPDATE, so it is only held while the registration row
+        is inserted.
+        """
+        return bool(
+            self.filter(pk=event_id, seats_taken__lt=F('capacity'))
+            .update(seats_taken=F('seats_taken') + 1)
+        )
+
+    def release_seat(self, event_id):
+        return bool(
+            self.filter(pk=event_id, seats_taken__gt=0)
+            .update(seats_taken=F('seats_taken') - 1)
+        )
 
-class Event(TimestampMixin):
+    def with_effective_status(self, now=None):
+        """Annotate effective_status: 'past' once event_date has passed, even
+        if the sweeper hasn't updated the row yet."""
+        now = now or timezone.now()
+        return self.annotate(effective_status=Case(
+            When(event_date__lt=now, then=Value('past')),
+            default=F('status'),
+            output_field=models.CharField(),
+        ))
+
+    def upcoming(self, now=None):
+        now = now or timezone.now()
+        return self.with_effective_status(now).filter(status='upcoming', event_date__gte=now)
+
+    def past(self, now=None):
+        now = now or timezone.now()
+        return self.with_effective_status(now).filter(models.Q(status='past') | models.Q(event_date__lt=now))
+
+    def sweep_past(self, now=None):
+        """Mark every due upcoming event as past in one UPDATE.
+
+        Bypasses save() and signals; returns the number of events swept.
+        """
+        now = now or timezone.now()
+        return self.filter(status='upcoming', event_date__lt=now).update(status='past', updated_at=now)
+
+    def fill_from_waitlist(self, event_id):
+        """Promote waitlisted registrations, oldest first, into free seats.
+
+        Call inside the transaction that freed the seats: the seat counter
+        UPDATE keeps the event row locked until commit, so new registrants
+        can't take a freed seat ahead of the queue. Returns promoted ids.
+        """
+        promoted = []
+        waiting = EventRegistration.objects.filter(
+            event_id=event_id, status=EventRegistration.WAITLISTED
+        ).order_by('id')
+        with transaction.atomic(savepoint=False):
+            while True:
+                waiter = waiting.values_list('pk', flat=True).first()
+                if waiter is None or not self.reserve_seat(event_id):
+                    break
+                if waiting.filter(pk=waiter).update(status=EventRegistration.CONFIRMED):
+                    promoted.append(waiter)
+                else:
+                    # Cancelled or promoted by someone else meanwhile
+                    self.release_seat(event_id)
+        if promoted:
+            transaction.on_commit(
+                lambda: waitlist_promoted.send(sender=EventRegistration, registration_ids=promoted)
+            )
+        return promoted
+
+class Event(SlugMixin, CounterFieldsMixin, TimestampMixin):
     """Handles both upcoming and past events"""
     EVENT_STATUS = (
         ('upcoming', 'Upcoming Event'),
@@ -85,25 +256,30 @@ class Event(TimestampMixin):
     )
     event_category = models.CharField(max_length=100, blank=True, null=True)
     capacity = models.PositiveIntegerField(default=0)
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
     registration_deadline = models.DateTimeField(blank=True, null=True)
 
+    objects = EventManager()
+    counter_fields = ('seats_taken',)
+
     class Meta:
         ordering = ['-event_date']
         indexes = [
             models.Index(fields=['status', '-event_date']),
+            models.Index(fields=['event_date', 'id']),
             models.Index(fields=['slug']),
         ]
 
     @property
     def available_seats(self):
-        return self.capacity - self.registrations.count()
+        return max(self.capacity - self.seats_taken, 0)
 
     def clean(self):
         """Validate registration deadline"""
         if self.registration_deadline and self.registration_deadline > self.event_date:
             raise ValidationError("Registration deadline must be before event date")
         if not self.slug:
-            self.slug = slugify(self.title)
+            self.slug = slugs.allocate(self, self.title)
 
     def save(self, *args, **kwargs):
         """Update status based on current time"""
@@ -115,21 +291,90 @@ class Event(TimestampMixin):
     def __str__(self):
         return f"{self.title} ({self.get_status_display()})"
 
+# Sent with post_ids after counters are changed through PostManager.increment
+post_engagement_changed = Signal()
+# Sent with post_ids when the scheduler flips scheduled posts live
+posts_went_live = Signal()
+# Sent with registration_ids after waitlisted registrations get a seat
+waitlist_promoted = Signal()
+
 class PostManager(models.Manager):
     """Custom manager for post queries"""
-    def trending(self):
-        return self.get_queryset().annotate(
-            engagement_score=Count('likes') * 2 +
-                       F('comments_count') +
-                       F('views') +
-                       F('shares') * 3
-        ).order_by('-engagement_score', '-created_at')[:20]
+    def increment(self, deltas):
+        """Apply {post_id: {field: delta}} counter changes in a single UPDATE.
+
+        Uses F() expressions so concurrent writers never lose updates, and
+        moves engagement_score by the weighted sum of the same deltas.
+        """
+        if not deltas:
+            return 0
+        fields = {field for changes in deltas.values() for field in changes}
+        updates = {}
+        for field in fields:
+            updates[field] = F(field) + self._delta_case(
+                {pk: changes.get(field, 0) for pk, changes in deltas.items()}
+            )
+        updates['engagement_score'] = F('engagement_score') + self._delta_case({
+            pk: sum(Post.ENGAGEMENT_WEIGHTS.get(field, 0) * amount
+                    for field, amount in changes.items())
+            for pk, changes in deltas.items()
+        })
+        # updated_at marks the authors for the next incremental ranking run
+        updated = self.filter(pk__in=list(deltas)).update(updated_at=timezone.now(), **updates)
+        post_engagement_changed.send(sender=Post, post_ids=list(deltas))
+        return updated
+
+    def reconcile_counters(self):
+        """Recompute likes_count, comments_count and engagement_score for
+        every post in one UPDATE with correlated aggregates, repairing any
+        drift left by the incremental updates."""
+        likes = Coalesce(Subquery(
+            Post.likes.through.objects.filter(post_id=OuterRef('pk'))
+            .values('post_id').annotate(total=Count('*')).values('total')
+        ), 0)
+        comments = Coalesce(Subquery(
+            Comment.objects.filter(post_id=OuterRef('pk'))
+            .values('post_id').annotate(total=Count('*')).values('total')
+        ), 0)
+        weights = Post.ENGAGEMENT_WEIGHTS
+        return self.update(
+            likes_count=likes,
+            comments_count=comments,
+            engagement_score=(
+                likes * weights['likes_count'] +
+                comments * weights['comments_count'] +
+                F('views') * weights['views'] +
+                F('shares') * weights['shares']
+            ),
+        )
+
+    @staticmethod
+    def _delta_case(amounts):
+        whens = [When(pk=pk, then=Value(amount)) for pk, amount in amounts.items() if amount]
+        if not whens:
+            return Value(0)
+        return Case(*whens, default=Value(0), output_field=IntegerField())
+
+    def trending(self, category_id=None, limit=20):
+        """Hottest published posts, served from the precomputed leaderboard"""
+        from .trending import top_ids, ordered
+        return ordered(self.published(), top_ids(category_id, limit))
 
     def published(self):
-        return self.filter(is_draft=False, scheduled_publish_time__lte=timezone.now())
+        # is_live is maintained by Post.save and the scheduler, so this
+        # predicate doesn't depend on the current time
+        return self.filter(is_live=True, is_hidden=False)
 
-class Post(TimestampMixin):
+class Post(SlugMixin, CounterFieldsMixin, TimestampMixin):
     """Main discussion post model with engagement tracking"""
+    # Weight of each counter in engagement_score
+    ENGAGEMENT_WEIGHTS = {
+        'likes_count': 2,
+        'comments_count': 1,
+        'views': 1,
+        'shares': 3,
+    }
+
     author = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -164,6 +409,7 @@ class Post(TimestampMixin):
         blank=True,
         help_text="Users who liked this post"
     )
+    likes_count = models.PositiveIntegerField(default=0)
     views = models.PositiveIntegerField(default=0)
     shares = models.PositiveIntegerField(default=0)
     comments_count = models.PositiveIntegerField(default=0)
@@ -173,6 +419,15 @@ class Post(TimestampMixin):
     )
     is_draft = models.BooleanField(default=False)
     scheduled_publish_time = models.DateTimeField(blank=True, null=True)
+    is_live = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Published and past its scheduled time"
+    )
+    is_hidden = models.BooleanField(
+        default=False,
+        help_text="Hidden by moderation, automatically once reports pass the threshold"
+    )
     engagement_score = models.IntegerField(default=0, db_index=True)
     thumbnail = models.URLField(
         help_text="URL for post card image",
@@ -180,6 +435,8 @@ class Post(TimestampMixin):
     )
 
     objects = PostManager()
+    # Maintained through PostManager.increment(), never by saving the instance
+    counter_fields = ('likes_count', 'comments_count', 'views', 'shares', 'engagement_score')
 
     class Meta:
         ordering = ['-created_at']
@@ -187,6 +444,7 @@ class Post(TimestampMixin):
             models.Index(fields=['-created_at', 'category']),
             models.Index(fields=['is_pinned', '-created_at']),
             models.Index(fields=['scheduled_publish_time']),
+            models.Index(fields=['is_live', 'is_hidden', '-created_at']),
             models.Index(fields=['engagement_score']),
             models.Index(fields=['slug']),
         ]
@@ -198,16 +456,97 @@ class Post(TimestampMixin):
             self.scheduled_publish_time <= timezone.now()
         )
 
-    def calculate_engagement_score(self):
-        """Calculate and update the engagement score"""
-        self.engagement_score = (self.likes.count() * 2) + self.comments_count + self.views + (self.shares * 3)
-        self.save(update_fields=['engagement_score'])
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._was_live = self.__dict__.get('is_live')
+        self._original_category_id = self.__dict__.get('category_id')
+
+    def save(self, *args, **kwargs):
+        """Keep is_live in step with is_draft and scheduled_publish_time"""
+        self.is_live = self.is_published
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'is_draft', 'scheduled_publish_time'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'is_live'}
+        super().save(*args, **kwargs)
+        self._was_live = self.is_live
+        self._original_category_id = self.category_id
+        if not self.is_live and not self.is_draft and self.scheduled_publish_time:
+            from .scheduler import schedule
+            schedule(self.scheduled_publish_time)
 
     def __str__(self):
         return f"Post: {self.title[:50]}"
 
+class CommentQuerySet(models.QuerySet):
+    def delete(self):
+        """Delete the comments with their replies and adjust each post's
+        comments_count once; also the path of the admin's bulk delete"""
+        subtrees, unthreaded = models.Q(), {}
+        for pk, post_id, path in self.values_list('pk', 'post_id', 'path'):
+            if path:
+                subtrees |= models.Q(post_id=post_id, path__gte=path, path__lt=path + Comment.PATH_END)
+            else:
+                unthreaded[post_id] = unthreaded.get(post_id, 0) + 1
+        with transaction.atomic(savepoint=False):
+            removed = dict(
+                Comment.objects.filter(subtrees).order_by().values_list('post_id').annotate(total=Count('pk'))
+            ) if subtrees else {}
+            result = super().delete()
+            for post_id, total in unthreaded.items():
+                removed[post_id] = removed.get(post_id, 0) + total
+            Post.objects.increment({post_id: {'comments_count': -total} for post_id, total in removed.items()})
+        return result
+
+class CommentManager(models.Manager.from_queryset(CommentQuerySet)):
+    """Custom manager for comment queries"""
+    def previews(self, post_ids, per_post=3):
+        """First `per_post` top-level comments of each post, in one query.
+
+        Returns {post_id: [comment, ...]}; posts without comments are absent.
+        """
+        comments = self.filter(
+            post_id__in=post_ids, parent_comment__isnull=True, is_hidden=False
+        ).annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=[F('post_id')],
+                order_by=[F('created_at').asc(), F('id').asc()],
+            )
+        ).filter(position__lte=per_post).select_related('author__profile').order_by('post_id', 'position')
+        previews = {}
+        for comment in comments:
+            previews.setdefault(comment.post_id, []).append(comment)
+        return previews
+
+    def visible(self):
+        """Comments not hidden by moderation; hiding covers a comment's replies too"""
+        return self.filter(is_hidden=False)
+
+    def thread(self, post, root=None, max_depth=None, after=None):
+        """A post's comments, or the subtree under `root`, in display order.
+
+        Served by one range scan over the (post, path) index. `max_depth` is
+        relative to the root; `after` is the path of the last comment already
+        shown, for fetching the next page.
+        """
+        comments = self.visible().filter(post=post)
+        base_depth = 0
+        if root is not None:
+            comments = comments.filter(path__gte=root.path, path__lt=root.path + Comment.PATH_END)
+            base_depth = root.depth
+        if max_depth is not None:
+            comments = comments.filter(depth__lte=base_depth + max_depth)
+        if after:
+            comments = comments.filter(path__gt=after)
+        return comments.order_by('path')
+
 class Comment(TimestampMixin):
     """Nested comments for discussion posts"""
+    # Materialized path: one zero-padded id per ancestor, root first, so
+    # sorting by path gives depth-first display order.
+    PATH_SEGMENT_WIDTH = 10
+    PATH_END = '~'  # Sorts after every digit, bounds subtree range scans
+    MAX_DEPTH = 24
     post = models.ForeignKey(
         Post,
         on_delete=models.CASCADE,
@@ -231,39 +570,129 @@ class Comment(TimestampMixin):
         blank=True,
         related_name='replies'
     )
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     is_edited = models.BooleanField(default=False)
-    edit_history = models.JSONField(default=list, blank=True)
+    is_hidden = models.BooleanField(
+        default=False,
+        help_text="Hidden by moderation, along with its replies"
+    )
+
+    objects = CommentManager()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._original_content = self.content
+        # Read without triggering a fetch when content is deferred
+        self._original_content = self.__dict__.get('content')
 
     def save(self, *args, **kwargs):
-        """Track edits and update post's comment count"""
-        if self.pk and self.content != self._original_content:
-            self.edit_history.append({
-                'previous_content': self._original_content,
-                'edited_at': timezone.now().isoformat()
-            })
+        """Single write pipeline for comments.
+
+        An edit is one UPDATE plus one appended CommentRevision. A new
+        comment is its INSERT, one UPDATE for the thread path and one
+        counter UPDATE on the post.
+        """
+        creating = self._state.adding
+        edited = (
+            not creating and self._original_content is not None
+            and self.content != self._original_content
+        )
+        if edited:
             self.is_edited = True
-        super().save(*args, **kwargs)
+        if creating and self.parent_comment_id:
+            self.depth = self.parent_comment.depth + 1
+            if self.depth > self.MAX_DEPTH:
+                raise ValidationError("Replies cannot be nested this deeply")
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if creating:
+                parent_path = self.parent_comment.path if self.parent_comment_id else ''
+                self.path = parent_path + f'{self.pk:0{self.PATH_SEGMENT_WIDTH}d}'
+                Comment.objects.filter(pk=self.pk).update(path=self.path)
+                Post.objects.increment({self.post_id: {'comments_count': 1}})
+            if edited:
+                CommentRevision.objects.create(
+                    comment=self,
+                    diff=make_diff(self.content, self._original_content),
+                )
         self._original_content = self.content
-        self.post.calculate_engagement_score()
 
     def delete(self, *args, **kwargs):
-        """Update post's comment count when deleted"""
-        post = self.post
-        super().delete(*args, **kwargs)
-        post.calculate_engagement_score()
+        """Delete the comment with its replies and adjust the post counters once"""
+        with transaction.atomic(savepoint=False):
+            removed = Comment.objects.filter(
+                post_id=self.post_id, path__gte=self.path, path__lt=self.path + self.PATH_END
+            ).count() if self.path else 1
+            result = super().delete(*args, **kwargs)
+            Post.objects.increment({self.post_id: {'comments_count': -removed}})
+        return result
 
     class Meta:
         ordering = ['created_at']
         verbose_name = "Post Comment"
         verbose_name_plural = "Post Comments"
+        indexes = [
+            models.Index(fields=['post', 'path']),
+            models.Index(fields=['post', 'is_hidden', 'path']),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author or 'Anonymous'} on {self.post}"
 
+class CommentRevision(models.Model):
+    """Append-only edit log; each row can rebuild the text before one edit"""
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='revisions'
+    )
+    diff = models.JSONField(help_text="Reverse diff from the edited text to the previous text")
+    edited_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-edited_at', '-id']
+        indexes = [models.Index(fields=['comment', '-edited_at'])]
+
+    def __str__(self):
+        return f"Revision of comment {self.comment_id} at {self.edited_at}"
+
+class TimelineEntry(models.Model):
+    """A post pushed into a subscriber's home feed when it was published"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    published_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [models.Index(fields=['user', '-published_at', '-post'])]
+
+    def __str__(self):
+        return f"{self.post} in {self.user}'s feed"
+
+class UserProfileManager(models.Manager):
+    def provision(self, users, batch_size=1000):
+        """Create missing profiles for users (or user ids) in bulk, e.g. after
+        User.objects.bulk_create(), which sends no post_save. Returns the
+        number of profiles that were missing."""
+        user_ids = list(dict.fromkeys(getattr(user, 'pk', user) for user in users))
+        created = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            existing = set(self.filter(user_id__in=batch).values_list('user_id', flat=True))
+            missing = [self.model(user_id=user_id) for user_id in batch if user_id not in existing]
+            # A profile created meanwhile by another process is skipped
+            self.bulk_create(missing, ignore_conflicts=True)
+            created += len(missing)
+        return created
+
 class UserProfile(TimestampMixin):
     """Extended user profile with community features"""
     user = models.OneToOneField(
@@ -278,7 +707,10 @@ class UserProfile(TimestampMixin):
         blank=True,
         validators=[MinLengthValidator(20)]
     )
-    community_rank = models.PositiveIntegerField(default=0)
+    community_rank = models.PositiveIntegerField(
+        default=0, help_text="Rank by community_score, set by the rank_users command; 0 until the user has a score"
+    )
+    community_score = models.IntegerField(default=0, editable=False)
     notification_preferences = models.JSONField(default=dict)
     verification_status = models.CharField(
         max_length=20,
@@ -289,17 +721,55 @@ class UserProfile(TimestampMixin):
         ],
         default='unverified'
     )
-    last_active = models.DateTimeField(blank=True, null=True)
+    last_active = models.DateTimeField(
+        blank=True, null=True,
+        help_text="Recorded by LastActiveMiddleware, at most once every COMMUNITY_ACTIVITY_INTERVAL minutes"
+    )
+    calendar_token_version = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Signed into calendar feed tokens; bumping it revokes the user's feed URLs"
+    )
+
+    objects = UserProfileManager()
 
     class Meta:
         verbose_name = "User Profile"
         verbose_name_plural = "User Profiles"
+        indexes = [
+            models.Index(fields=['-community_score']),
+            models.Index(fields=['last_active']),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class RankingRun(models.Model):
+    """One run of the ranking job; the latest one's start time is where the
+    next incremental run picks up"""
+    started_at = models.DateTimeField(db_index=True)
+    full = models.BooleanField(default=False)
+    rescored = models.PositiveIntegerField(default=0)
+    reranked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Ranking run at {self.started_at}"
+
 class EventRegistration(TimestampMixin):
-    """Tracks event participation"""
+    """Tracks event participation.
+
+    Registrations made while the event is full join its waitlist and are
+    promoted in FIFO order (by id) as seats free up.
+    """
+    CONFIRMED = 'confirmed'
+    WAITLISTED = 'waitlisted'
+    STATUS_CHOICES = (
+        (CONFIRMED, 'Confirmed'),
+        (WAITLISTED, 'Waitlisted'),
+    )
+
     event = models.ForeignKey(
         Event,
         on_delete=models.CASCADE,
@@ -310,11 +780,37 @@ class EventRegistration(TimestampMixin):
         on_delete=models.CASCADE,
         related_name='event_registrations'
     )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=CONFIRMED, editable=False)
 
     class Meta:
         unique_together = ('event', 'user')
         verbose_name = "Event Registration"
         verbose_name_plural = "Event Registrations"
+        indexes = [
+            models.Index(fields=['event', 'status', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        """Claim a seat when a registration is first created, or join the waitlist"""
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        with transaction.atomic(savepoint=False):
+            if self.status == self.CONFIRMED and not Event.objects.reserve_seat(self.event_id):
+                self.status = self.WAITLISTED
+            super().save(*args, **kwargs)
+
+    @property
+    def waitlist_position(self):
+        """1-based place in the waitlist, or None once confirmed.
+
+        Counts earlier waiters with a range scan of the (event, status, id)
+        index.
+        """
+        if self.status != self.WAITLISTED:
+            return None
+        return EventRegistration.objects.filter(
+            event_id=self.event_id, status=self.WAITLISTED, pk__lte=self.pk
+        ).count()
 
     def __str__(self):
         return f"{self.user} registered for {self.event}"
@@ -327,6 +823,11 @@ class Report(TimestampMixin):
         ('inappropriate', 'Inappropriate'),
         ('other', 'Other'),
     )
+    # A reporter's first report on some content raises its moderation
+    # priority by the type weight times the reporter's trust weight
+    PRIORITY_WEIGHTS = {'abuse': 3, 'inappropriate': 2, 'spam': 1, 'other': 1}
+    REPORTER_TRUST_WEIGHTS = {'verified': 3, 'pending': 1, 'unverified': 1}
+    PENDING = ('open', 'reviewed')
 
     reporter = models.ForeignKey(
         User,
@@ -353,7 +854,8 @@ class Report(TimestampMixin):
         choices=[
             ('open', 'Open'),
             ('reviewed', 'Reviewed'),
-            ('resolved', 'Resolved')
+            ('resolved', 'Resolved'),
+            ('dismissed', 'Dismissed'),
         ],
         default='open'
     )
@@ -369,4 +871,79 @@ class Report(TimestampMixin):
         ]
 
     def __str__(self):
-        return f"Report on {self.post or self.comment} ({self.report_type})"
\ No newline at end of file
+        return f"Report on {self.post or self.comment} ({self.report_type})"
+
+    def target_filter(self, prefix=''):
+        """Lookup matching reports of the same post or comment as this one"""
+        if self.comment_id:
+            return {f'{prefix}comment_id': self.comment_id}
+        return {f'{prefix}post_id': self.post_id, f'{prefix}comment__isnull': True}
+
+class ModerationItem(TimestampMixin):
+    """One moderation queue entry per reported post or comment.
+
+    Reports are folded in as they are created (see moderation.record), so the
+    queue is read from this table instead of grouping Report rows. A report
+    naming a comment belongs to the comment's item, otherwise to the post's.
+    Counts cover the reports since the item was last resolved or dismissed.
+    """
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('resolved', 'Resolved'),
+        ('dismissed', 'Dismissed'),
+    )
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='moderation_items'
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='moderation_items'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    report_count = models.PositiveIntegerField(default=0)
+    reporter_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Distinct reporters; repeat reports by one user count once"
+    )
+    priority = models.PositiveIntegerField(
+        default=0,
+        help_text="Weighted report score; the content is hidden once it reaches COMMUNITY_AUTO_HIDE_THRESHOLD"
+    )
+    last_reported_at = models.DateTimeField(null=True, blank=True)
+    resolution_details = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-priority', '-last_reported_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', '-last_reported_at']),
+            models.Index(fields=['status', '-created_at', '-id']),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(post__isnull=False) | models.Q(comment__isnull=False),
+                name='moderation_item_target_required'
+            ),
+            models.UniqueConstraint(
+                fields=['post'], condition=models.Q(comment__isnull=True),
+                name='unique_post_moderation_item'
+            ),
+            models.UniqueConstraint(
+                fields=['comment'], condition=models.Q(comment__isnull=False),
+                name='unique_comment_moderation_item'
+            ),
+        ]
+
+    @property
+    def target(self):
+        return self.comment or self.post
+
+    def __str__(self):
+        return f"{self.target} ({self.report_count} reports, {self.get_status_display()})"
@@ -0,0 +1,178 @@
+"""Moderation queue built from reports.
+
+record() folds each new report into the ModerationItem of the post or
+comment it targets, so the queue never groups Report rows at read time.
+An item's priority is its weighted report counter: once it reaches
+COMMUNITY_AUTO_HIDE_THRESHOLD the content is hidden until a moderator
+dismisses the item. close() resolves or dismisses items together with their
+pending reports in set-based UPDATEs. Reports closed, edited or deleted one
+by one go through close_reports() or refresh(), which recount their items
+and hide or restore the content as the priority crosses the threshold.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+from .models import Comment, ModerationItem, Post, Report, UserProfile
+from . import cache
+from . import trending
+
+
+def auto_hide_threshold():
+    """Priority at which reported content is hidden; 0 or None disables auto-hiding."""
+    return getattr(settings, 'COMMUNITY_AUTO_HIDE_THRESHOLD', 10)
+
+
+def _weight(report_type, trust):
+    return Report.PRIORITY_WEIGHTS.get(report_type, 1) * Report.REPORTER_TRUST_WEIGHTS.get(trust, 1)
+
+
+def report_weight(report):
+    trust = UserProfile.objects.filter(user_id=report.reporter_id).values_list(
+        'verification_status', flat=True
+    ).first()
+    return _weight(report.report_type, trust)
+
+
+def record(report):
+    """Add a new report to its target's queue item, reopening a closed one."""
+    repeat = bool(report.reporter_id) and Report.objects.filter(
+        reporter_id=report.reporter_id, status__in=Report.PENDING, **report.target_filter()
+    ).exclude(pk=report.pk).exists()
+    new_reporter = 0 if repeat else 1
+    weight = 0 if repeat else report_weight(report)
+
+    def bump(field, amount):
+        # A closed item starts counting again from this report
+        return Case(
+            When(status='open', then=F(field) + amount),
+            default=Value(amount),
+        )
+
+    with transaction.atomic(savepoint=False):
+        item, _ = ModerationItem.objects.get_or_create(**report.target_filter())
+        ModerationItem.objects.filter(pk=item.pk).update(
+            status='open',
+            report_count=bump('report_count', 1),
+            reporter_count=bump('reporter_count', new_reporter),
+            priority=bump('priority', weight),
+            last_reported_at=report.created_at,
+        )
+        threshold = auto_hide_threshold()
+        if threshold and weight:
+            priority = ModerationItem.objects.filter(pk=item.pk).values_list('priority', flat=True).get()
+            if priority - weight < threshold <= priority:
+                set_hidden(ModerationItem.objects.filter(pk=item.pk), True)
+    return item
+
+
+def set_hidden(items, hidden):
+    """Hide or unhide the posts and comment subtrees behind a queryset of items."""
+    post_ids = list(items.filter(comment__isnull=True).values_list('post_id', flat=True))
+    subtrees = Q()
+    for post_id, path in Comment.objects.filter(
+        pk__in=items.filter(comment__isnull=False).values('comment_id')
+    ).values_list('post_id', 'path'):
+        subtrees |= Q(post_id=post_id, path__gte=path, path__lt=path + Comment.PATH_END)
+    if post_ids:
+        Post.objects.filter(pk__in=post_ids).exclude(is_hidden=hidden).update(
+            is_hidden=hidden, updated_at=timezone.now()
+        )
+    if subtrees:
+        Comment.objects.filter(subtrees).exclude(is_hidden=hidden).update(is_hidden=hidden)
+    if post_ids or subtrees:
+        def refresh():
+            cache.bump('community.post', 'community.category-counts')
+            trending.refresh(post_ids)
+        transaction.on_commit(refresh)
+
+
+def pending_reports(items):
+    """Pending reports belonging to a queryset of items"""
+    return Report.objects.filter(status__in=Report.PENDING).filter(
+        Q(comment_id__in=items.filter(comment__isnull=False).values('comment_id')) |
+        Q(comment__isnull=True, post_id__in=items.filter(comment__isnull=True).values('post_id'))
+    )
+
+
+def items_for(reports):
+    """Ids of the queue items that a queryset of reports belongs to"""
+    return list(ModerationItem.objects.filter(
+        Q(comment_id__in=reports.filter(comment__isnull=False).values('comment_id')) |
+        Q(comment__isnull=True, post_id__in=reports.filter(comment__isnull=True).values('post_id'))
+    ).values_list('pk', flat=True))
+
+
+def _target(obj):
+    return ('comment', obj.comment_id) if obj.comment_id else ('post', obj.post_id)
+
+
+def refresh(item_ids, restore=True):
+    """Recount open items from their pending reports, as record() would have
+    counted them; items left with no pending report are resolved.
+
+    Content is hidden when the new priority reaches the auto-hide threshold.
+    With `restore`, content is shown again when the priority falls back
+    below it, e.g. because reports were dismissed or deleted. Pass False
+    when reports were resolved, which upholds them.
+    """
+    items = list(ModerationItem.objects.filter(pk__in=item_ids, status='open'))
+    if not items:
+        return
+    threshold = auto_hide_threshold()
+    hide, show = [], []
+    reports = {}
+    for report in pending_reports(ModerationItem.objects.filter(pk__in=item_ids)).select_related(
+        'reporter__profile'
+    ).order_by('id'):
+        reports.setdefault(_target(report), []).append(report)
+    for item in items:
+        pending = reports.get(_target(item), [])
+        previous = item.priority
+        reporters, item.priority = set(), 0
+        for report in pending:
+            if report.reporter_id and report.reporter_id in reporters:
+                continue  # Repeat reports don't add weight
+            if report.reporter_id:
+                reporters.add(report.reporter_id)
+            profile = getattr(report.reporter, 'profile', None)
+            item.priority += _weight(report.report_type, getattr(profile, 'verification_status', None))
+        item.report_count = len(pending)
+        item.reporter_count = len(reporters) + sum(1 for report in pending if not report.reporter_id)
+        if not pending:
+            item.status = 'resolved'
+        item.updated_at = timezone.now()
+        if threshold and previous < threshold <= item.priority:
+            hide.append(item.pk)
+        elif threshold and restore and item.priority < threshold <= previous:
+            show.append(item.pk)
+    ModerationItem.objects.bulk_update(
+        items, ['status', 'report_count', 'reporter_count', 'priority', 'updated_at']
+    )
+    if hide:
+        set_hidden(ModerationItem.objects.filter(pk__in=hide), True)
+    if show:
+        set_hidden(ModerationItem.objects.filter(pk__in=show), False)
+
+
+def close_reports(reports, status, details=''):
+    """Resolve or dismiss individual reports and recount their items."""
+    with transaction.atomic():
+        item_ids = items_for(reports)
+        closed = reports.filter(status__in=Report.PENDING).update(status=status, resolution_details=details)
+        refresh(item_ids, restore=status != 'resolved')
+    return closed
+
+
+def close(items, status, details=''):
+    """Resolve or dismiss open items and their pending reports; returns the number closed.
+
+    Dismissing also restores content that was hidden automatically.
+    """
+    items = items.filter(status='open')
+    with transaction.atomic():
+        pending_reports(items).update(status=status, resolution_details=details)
+        if status == 'dismissed':
+            set_hidden(items, False)
+        return items.update(status=status, resolution_details=details)
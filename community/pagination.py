@@ -0,0 +1,89 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination
+
+
+class PostCursorPagination(CursorPagination):
+    """Keyset pagination for the post feed.
+
+    Pages walk non-pinned posts by -created_at (id breaks ties), which the
+    (is_pinned, -created_at) and (-created_at, category) indexes serve
+    directly, so deep pages cost the same as the first one. Cursors encode a
+    position rather than an offset and stay stable while new posts arrive.
+    The newest `pinned_limit` pinned posts are shown ahead of the first page,
+    whether it was reached without a cursor or by paging back.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    pinned_limit = 5
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = super().paginate_queryset(queryset.filter(is_pinned=False), request, view)
+        if page is None:
+            return None
+        if not self.has_previous:
+            pinned = list(queryset.filter(is_pinned=True).order_by(*self.ordering)[:self.pinned_limit])
+            self.page = pinned + page
+        return self.page
+
+
+class CommentCursorPagination(CursorPagination):
+    """Keyset pagination for a post's comments, oldest first"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('created_at', 'id')
+
+
+class EventCursorPagination(CursorPagination):
+    """Keyset pagination for events in date order, served by the (event_date, id) index"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('event_date', 'id')
+
+
+class ModerationCursorPagination(CursorPagination):
+    """Moderation queue, newest item first, served by the (status, -created_at, -id) index.
+
+    Priority changes with every report, so a cursor on it would skip or
+    repeat items between pages; each item carries its priority instead.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+
+class EstimatedCountPaginator(Paginator):
+    """Admin changelist paginator that avoids COUNT(*) over big unfiltered tables.
+
+    On PostgreSQL an unfiltered changelist is counted from the planner's
+    row estimate in pg_class; filtered lists, small tables and other
+    databases get the exact count. Pair with show_full_result_count = False.
+    """
+    exact_below = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = self._estimate(self.object_list)
+            if estimate is not None and estimate >= self.exact_below:
+                return estimate
+        return super().count
+
+    def _estimate(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [connection.ops.quote_name(queryset.model._meta.db_table)],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
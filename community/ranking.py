@@ -0,0 +1,101 @@
+"""Community ranking of users.
+
+A user's community_score is a weighted sum over their published,
+non-anonymous posts: one share per post plus the comments and likes those
+posts received and their engagement_score. community_rank is the user's
+RANK() by score, so ties share a rank; users without a score keep rank 0.
+
+run() rescores only the users whose posts or profile changed since the
+last run, recorded as a RankingRun row, then re-ranks everyone in one
+UPDATE joined to a RANK() OVER window, writing only the rows whose rank
+moved. Reads never compute anything: a user's rank is the stored column and
+leaderboard() is cached until the next run, or LEADERBOARD_TIMEOUT at most.
+"""
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Post, RankingRun, UserProfile
+from . import cache as community_cache
+
+SCORE_WEIGHTS = {
+    'posts': 10,
+    'comments_count': 2,
+    'likes_count': 3,
+    'engagement_score': 1,
+}
+LEADERBOARD_SIZE = 100
+LEADERBOARD_TIMEOUT = 600
+RUN_HISTORY = timedelta(days=30)
+
+
+def score():
+    """Correlated subquery computing community_score for each UserProfile row"""
+    posts = (
+        Post.objects.published().filter(author_id=OuterRef('user_id'), is_anonymous=False)
+        .order_by().values('author_id')
+        .annotate(score=(
+            Count('pk') * SCORE_WEIGHTS['posts'] +
+            Sum('comments_count') * SCORE_WEIGHTS['comments_count'] +
+            Sum('likes_count') * SCORE_WEIGHTS['likes_count'] +
+            Sum('engagement_score') * SCORE_WEIGHTS['engagement_score']
+        ))
+        .values('score')
+    )
+    return Coalesce(Subquery(posts), 0)
+
+
+def changed_since(since):
+    """Profiles whose own row or any of whose posts changed at or after `since`"""
+    return UserProfile.objects.filter(
+        Q(updated_at__gte=since) |
+        Q(user_id__in=Post.objects.filter(updated_at__gte=since).values('author_id'))
+    )
+
+
+def _rank():
+    table = connection.ops.quote_name(UserProfile._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            UPDATE {table} SET community_rank = ranked.community_rank
+            FROM (
+                SELECT id, CASE WHEN community_score > 0
+                    THEN RANK() OVER (ORDER BY community_score DESC) ELSE 0 END AS community_rank
+                FROM {table}
+            ) AS ranked
+            WHERE {table}.id = ranked.id AND {table}.community_rank <> ranked.community_rank
+        """)
+        return cursor.rowcount
+
+
+def run(full=False):
+    """Rescore changed users (every user when `full` or on the first run) and
+    re-rank; returns (rescored, reranked) row counts."""
+    started = timezone.now()
+    since = None if full else RankingRun.objects.values_list('started_at', flat=True).first()
+    profiles = UserProfile.objects.all() if since is None else changed_since(since)
+    with transaction.atomic():
+        rescored = profiles.update(community_score=score())
+        reranked = _rank()
+        # Changes made while this run was going are picked up by the next one
+        RankingRun.objects.create(started_at=started, full=since is None, rescored=rescored, reranked=reranked)
+        RankingRun.objects.filter(started_at__lt=started - RUN_HISTORY).delete()
+    if rescored or reranked:
+        community_cache.bump('community.ranking')
+    return rescored, reranked
+
+
+def leaderboard():
+    """The top LEADERBOARD_SIZE users as dicts, cached until the next run()"""
+    def build():
+        return [
+            {'user_id': user_id, 'username': username, 'community_rank': rank, 'community_score': points}
+            for user_id, username, rank, points in
+            UserProfile.objects.filter(community_score__gt=0)
+            .order_by('-community_score', 'user_id')
+            .values_list('user_id', 'user__username', 'community_rank', 'community_score')[:LEADERBOARD_SIZE]
+        ]
+    return community_cache.cached('community.ranking', build, LEADERBOARD_TIMEOUT)
@@ -0,0 +1,37 @@
+import difflib
+
+
+def make_diff(new, old):
+    """Compact reverse diff: the edits that turn `new` back into `old`.
+
+    A list of [start, end, replacement] operations against `new`; unchanged
+    text is not stored.
+    """
+    matcher = difflib.SequenceMatcher(None, new, old, autojunk=False)
+    return [
+        [i1, i2, old[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
+
+def apply_diff(new, diff):
+    """Rebuild the older text from `new` and a diff made by make_diff."""
+    parts, position = [], 0
+    for start, end, replacement in diff:
+        parts.append(new[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(new[position:])
+    return ''.join(parts)
+
+
+def history(content, revisions):
+    """Yield (revision, content before that edit), newest edit first.
+
+    `revisions` must be ordered newest first, as each diff applies to the
+    text produced by the edit after it.
+    """
+    for revision in revisions:
+        content = apply_diff(content, revision.diff)
+        yield revision, content
@@ -0,0 +1,73 @@
+"""Flips scheduled posts live at their due time.
+
+The due queue is the posts table itself: posts that are neither drafts nor
+live, ordered by scheduled_publish_time. Each process keeps one timer armed
+for the earliest due time it knows of; when it fires, every due post goes
+live in one UPDATE and the timer is re-armed for the next one. The
+publish_scheduled_posts command runs the same sweep from cron, which also
+covers posts scheduled by other processes.
+"""
+import threading
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Post, posts_went_live
+
+_lock = threading.Lock()
+_timer = None
+_armed_for = None
+
+
+def due_queue():
+    return Post.objects.filter(is_live=False, is_draft=False, scheduled_publish_time__isnull=False)
+
+
+def publish_due_posts(now=None):
+    """Make every post whose time has come live; returns their ids."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        post_ids = list(
+            due_queue().filter(scheduled_publish_time__lte=now)
+            .select_for_update(skip_locked=True).values_list('pk', flat=True)
+        )
+        if post_ids:
+            Post.objects.filter(pk__in=post_ids).update(is_live=True, updated_at=now)
+            transaction.on_commit(lambda: posts_went_live.send(sender=Post, post_ids=post_ids))
+    return post_ids
+
+
+def schedule(when):
+    """Make sure a timer fires no later than `when`."""
+    global _timer, _armed_for
+    with _lock:
+        if _armed_for is not None and _armed_for <= when:
+            return
+        if _timer is not None:
+            _timer.cancel()
+        delay = max((when - timezone.now()).total_seconds(), 0)
+        _timer = threading.Timer(delay, _fire)
+        _timer.daemon = True
+        _armed_for = when
+        _timer.start()
+
+
+def arm():
+    """Arm the timer for the earliest scheduled post, if any."""
+    when = due_queue().order_by('scheduled_publish_time').values_list(
+        'scheduled_publish_time', flat=True
+    ).first()
+    if when is not None:
+        schedule(when)
+
+
+def _fire():
+    global _timer, _armed_for
+    with _lock:
+        _timer = None
+        _armed_for = None
+    try:
+        publish_due_posts()
+        arm()
+    finally:
+        connections.close_all()
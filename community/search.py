@@ -0,0 +1,283 @@
+"""Full-text search over post titles/content and comment content.
+
+PostgreSQL keeps a weighted tsvector column with a GIN index on each table,
+maintained by BEFORE INSERT/UPDATE triggers. SQLite keeps an FTS5 table
+maintained by AFTER triggers; its rowid encodes the source row (post id * 2,
+comment id * 2 + 1) so updates and deletes are rowid lookups. Other
+databases get no index and search() returns None.
+
+The triggers are (re)installed idempotently after every migrate, because
+SQLite drops them whenever Django rebuilds a table.
+"""
+import html
+
+from django.db import connection
+
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+# The database highlights with these private-use characters; the snippet is
+# HTML-escaped before they become tags, so user content can't inject markup.
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_END = '\ue001'
+
+POSTGRES_SQL = [
+    "ALTER TABLE community_post ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "ALTER TABLE community_comment ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE INDEX IF NOT EXISTS community_post_search_idx ON community_post USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS community_comment_search_idx ON community_comment USING GIN (search_vector)",
+    """
+    CREATE OR REPLACE FUNCTION community_post_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION community_comment_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE TRIGGER community_post_search_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON community_post
+    FOR EACH ROW EXECUTE FUNCTION community_post_search_update()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER community_comment_search_trigger
+    BEFORE INSERT OR UPDATE OF content ON community_comment
+    FOR EACH ROW EXECUTE FUNCTION community_comment_search_update()
+    """,
+]
+
+POSTGRES_BACKFILL = [
+    "UPDATE community_post SET title = title WHERE search_vector IS NULL",
+    "UPDATE community_comment SET content = content WHERE search_vector IS NULL",
+]
+
+SQLITE_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS community_search
+    USING fts5(post_id UNINDEXED, title, content, tokenize='porter unicode61')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_search_post_insert AFTER INSERT ON community_post BEGIN
+        INSERT INTO community_search(rowid, post_id, title, content)
+        VALUES (new.id * 2, new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_search_post_update
+    AFTER UPDATE OF title, content ON community_post BEGIN
+        DELETE FROM community_search WHERE rowid = old.id * 2;
+        INSERT INTO community_search(rowid, post_id, title, content)
+        VALUES (new.id * 2, new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_search_post_delete AFTER DELETE ON community_post BEGIN
+        DELETE FROM community_search WHERE rowid = old.id * 2;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_search_comment_insert AFTER INSERT ON community_comment BEGIN
+        INSERT INTO community_search(rowid, post_id, title, content)
+        VALUES (new.id * 2 + 1, new.post_id, '', new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_search_comment_update
+    AFTER UPDATE OF content ON community_comment BEGIN
+        DELETE FROM community_search WHERE rowid = old.id * 2 + 1;
+        INSERT INTO community_search(rowid, post_id, title, content)
+        VALUES (new.id * 2 + 1, new.post_id, '', new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS community_search_comment_delete AFTER DELETE ON community_comment BEGIN
+        DELETE FROM community_search WHERE rowid = old.id * 2 + 1;
+    END
+    """,
+]
+
+SQLITE_BACKFILL = [
+    "DELETE FROM community_search",
+    """
+    INSERT INTO community_search(rowid, post_id, title, content)
+    SELECT id * 2, id, title, content FROM community_post
+    """,
+    """
+    INSERT INTO community_search(rowid, post_id, title, content)
+    SELECT id * 2 + 1, post_id, '', content FROM community_comment
+    """,
+]
+
+
+def is_supported(conn=None):
+    return (conn or connection).vendor in ('postgresql', 'sqlite')
+
+
+def install(conn=None, backfill=False):
+    """Create the index and its triggers if missing; optionally index existing rows."""
+    conn = conn or connection
+    if conn.vendor == 'postgresql':
+        statements = POSTGRES_SQL + (POSTGRES_BACKFILL if backfill else [])
+    elif conn.vendor == 'sqlite':
+        statements = SQLITE_SQL + (SQLITE_BACKFILL if backfill else [])
+    else:
+        return
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall(conn=None):
+    conn = conn or connection
+    if conn.vendor == 'postgresql':
+        statements = [
+            "DROP TRIGGER IF EXISTS community_post_search_trigger ON community_post",
+            "DROP TRIGGER IF EXISTS community_comment_search_trigger ON community_comment",
+            "DROP FUNCTION IF EXISTS community_post_search_update()",
+            "DROP FUNCTION IF EXISTS community_comment_search_update()",
+            "ALTER TABLE community_post DROP COLUMN IF EXISTS search_vector",
+            "ALTER TABLE community_comment DROP COLUMN IF EXISTS search_vector",
+        ]
+    elif conn.vendor == 'sqlite':
+        statements = [
+            f"DROP TRIGGER IF EXISTS community_search_{table}_{event}"
+            for table in ('post', 'comment') for event in ('insert', 'update', 'delete')
+        ] + ["DROP TABLE IF EXISTS community_search"]
+    else:
+        return
+    with conn.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def highlight(snippet):
+    """Escape a database snippet and turn its highlight markers into <mark> tags."""
+    return html.escape(snippet or '').replace(HIGHLIGHT_START, SNIPPET_START).replace(HIGHLIGHT_END, SNIPPET_END)
+
+
+def _fts5_query(query):
+    # Quote every term so user input can't use FTS5 query syntax
+    terms = [term.replace('"', '""') for term in query.split()]
+    return ' '.join(f'"{term}"' for term in terms if term)
+
+
+def search(query, limit=20, offset=0, kinds=('post', 'comment')):
+    """Ranked matches as dicts with kind, id, post_id, rank and snippet.
+
+    Only visible posts and the visible comments of visible posts are
+    returned. Returns None when the database has no full-text index.
+    """
+    from .models import Post
+    if not is_supported():
+        return None
+    if not query.strip():
+        return []
+    visible_sql, visible_params = (
+        Post.objects.published().order_by().values('id').query.sql_with_params()
+    )
+    if connection.vendor == 'postgresql':
+        sql, params = _postgres_search(query, kinds, visible_sql, visible_params, limit, offset)
+    else:
+        sql, params = _sqlite_search(query, kinds, visible_sql, visible_params, limit, offset)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {'kind': kind, 'id': pk, 'post_id': post_id, 'rank': rank, 'snippet': highlight(snippet)}
+            for kind, pk, post_id, rank, snippet in cursor.fetchall()
+        ]
+
+
+def _postgres_search(query, kinds, visible_sql, visible_params, limit, offset):
+    selects, params = [], []
+    if 'post' in kinds:
+        selects.append(f"""
+            SELECT 'post' AS kind, p.id, p.id AS post_id,
+                   ts_rank(p.search_vector, q.query) AS rank,
+                   p.title || ' ' || p.content AS body
+            FROM community_post p, q
+            WHERE p.search_vector @@ q.query AND p.id IN ({visible_sql})
+        """)
+        params += visible_params
+    if 'comment' in kinds:
+        selects.append(f"""
+            SELECT 'comment' AS kind, c.id, c.post_id,
+                   ts_rank(c.search_vector, q.query) AS rank,
+                   c.content AS body
+            FROM community_comment c, q
+            WHERE c.search_vector @@ q.query AND NOT c.is_hidden AND c.post_id IN ({visible_sql})
+        """)
+        params += visible_params
+    # Headlines are expensive, so only build them for the page being served.
+    sql = f"""
+        WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+        hits AS (
+            {' UNION ALL '.join(selects)}
+            ORDER BY rank DESC, id DESC
+            LIMIT %s OFFSET %s
+        )
+        SELECT hits.kind, hits.id, hits.post_id, hits.rank,
+               ts_headline('english', hits.body, q.query,
+                           'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxFragments=2, MaxWords=20, MinWords=5')
+        FROM hits, q
+        ORDER BY hits.rank DESC, hits.id DESC
+    """
+    return sql, [query] + params + [limit, offset]
+
+
+def _sqlite_search(query, kinds, visible_sql, visible_params, limit, offset):
+    parity = []
+    if 'post' in kinds:
+        parity.append('0')
+    if 'comment' in kinds:
+        parity.append('1')
+    # bm25() is lower-is-better; weights are per column: post_id, title, content.
+    sql = f"""
+        SELECT CASE rowid %% 2 WHEN 0 THEN 'post' ELSE 'comment' END,
+               rowid / 2, post_id,
+               -bm25(community_search, 0.0, 10.0, 1.0) AS rank,
+               snippet(community_search, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16)
+        FROM community_search
+        WHERE community_search MATCH %s
+          AND rowid %% 2 IN ({', '.join(parity)})
+          AND post_id IN ({visible_sql})
+          AND (rowid %% 2 = 0 OR rowid / 2 NOT IN (SELECT id FROM community_comment WHERE is_hidden))
+        ORDER BY rank DESC, rowid DESC
+        LIMIT %s OFFSET %s
+    """
+    return sql, [_fts5_query(query)] + list(visible_params) + [limit, offset]
+
+
+def matching_ids(kind, query, limit=1000):
+    """Ids of the best `limit` posts or comments for the admin search box.
+
+    Unlike search() this includes drafts and scheduled posts. Returns None
+    when the database has no full-text index.
+    """
+    if not is_supported():
+        return None
+    if not query.strip():
+        return []
+    if connection.vendor == 'postgresql':
+        table = 'community_post' if kind == 'post' else 'community_comment'
+        sql = f"""
+            SELECT id FROM {table}, websearch_to_tsquery('english', %s) q
+            WHERE search_vector @@ q ORDER BY ts_rank(search_vector, q) DESC LIMIT %s
+        """
+        params = [query, limit]
+    else:
+        sql = """
+            SELECT rowid / 2 FROM community_search
+            WHERE community_search MATCH %s AND rowid %% 2 = %s
+            ORDER BY bm25(community_search, 0.0, 10.0, 1.0) LIMIT %s
+        """
+        params = [_fts5_query(query), 0 if kind == 'post' else 1, limit]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
@@ -1,15 +1,22 @@
 from rest_framework import serializers
 from .models import *
+from . import cache as community_cache
 
 class CategorySerializer(serializers.ModelSerializer):
+    post_count = serializers.SerializerMethodField()
+
     class Meta:
         model = Category
         fields = '__all__'
 
+    def get_post_count(self, obj):
+        return community_cache.category_post_counts().get(obj.pk, 0)
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProfile
-        fields = ['profile_picture', 'bio', 'community_rank', 'verification_status', 'last_active']
+        fields = ['profile_picture', 'bio', 'community_rank', 'community_score', 'verification_status', 'last_active']
+        read_only_fields = ['community_rank']
 
 class UserSerializer(serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
@@ -24,17 +31,68 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
         fields = '__all__'
-        read_only_fields = ['edit_history', 'is_edited']
+        read_only_fields = ['is_edited', 'is_hidden']
+
+class CommentRevisionSerializer(serializers.ModelSerializer):
+    previous_content = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = CommentRevision
+        fields = ['id', 'edited_at', 'previous_content']
+
+class CommentThreadSerializer(CommentSerializer):
+    """Comment in a threaded listing, flagging replies cut off by the depth limit"""
+    has_more_replies = serializers.SerializerMethodField()
+
+    def get_has_more_replies(self, obj):
+        return obj.pk in self.context.get('collapsed_comments', ())
+
+def liked_post_ids(request, post_ids):
+    """Which of post_ids the requesting user has liked, in one IN query"""
+    user = getattr(request, 'user', None)
+    if not post_ids or user is None or not user.is_authenticated:
+        return set()
+    return set(
+        Post.likes.through.objects.filter(user=user, post_id__in=post_ids)
+        .values_list('post_id', flat=True)
+    )
+
+class PostListSerializer(serializers.ListSerializer):
+    """Fetches comment previews and liked_by_me for a whole page of posts at once"""
+    def to_representation(self, data):
+        posts = list(data.all() if hasattr(data, 'all') else data)
+        post_ids = [post.pk for post in posts]
+        self.context['comment_previews'] = Comment.objects.previews(
+            post_ids, PostSerializer.COMMENT_PREVIEW_SIZE
+        )
+        self.context['liked_post_ids'] = liked_post_ids(self.context.get('request'), post_ids)
+        return super().to_representation(posts)
 
 class PostSerializer(serializers.ModelSerializer):
+    COMMENT_PREVIEW_SIZE = 3
+
     author = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
-    comments = CommentSerializer(many=True, read_only=True)
+    comments_preview = serializers.SerializerMethodField()
+    liked_by_me = serializers.SerializerMethodField()
     
     class Meta:
         model = Post
-        fields = '__all__'
-        read_only_fields = ['slug', 'engagement_score', 'comments_count']
+        exclude = ['likes']
+        read_only_fields = ['slug', 'engagement_score', 'likes_count', 'comments_count', 'is_hidden']
+        list_serializer_class = PostListSerializer
+
+    def get_comments_preview(self, obj):
+        previews = self.context.get('comment_previews')
+        if previews is None:
+            previews = Comment.objects.previews([obj.pk], self.COMMENT_PREVIEW_SIZE)
+        return CommentSerializer(previews.get(obj.pk, []), many=True, context=self.context).data
+
+    def get_liked_by_me(self, obj):
+        liked = self.context.get('liked_post_ids')
+        if liked is None:
+            liked = liked_post_ids(self.context.get('request'), [obj.pk])
+        return obj.pk in liked
 
 class EventSerializer(serializers.ModelSerializer):
     available_seats = serializers.IntegerField(read_only=True)
@@ -43,8 +101,15 @@ class EventSerializer(serializers.ModelSerializer):
         model = Event
         fields = '__all__'
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Listings annotate the status as of now, ahead of the sweeper
+        data['status'] = getattr(instance, 'effective_status', instance.status)
+        return data
+
 class EventRegistrationSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    waitlist_position = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = EventRegistration
@@ -54,4 +119,22 @@ class ReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Report
         fields = '__all__'
-        read_only_fields = ['reporter', 'status', 'resolution_details']
\ No newline at end of file
+        read_only_fields = ['reporter', 'status', 'resolution_details']
+
+class ModerationItemSerializer(serializers.ModelSerializer):
+    target_type = serializers.SerializerMethodField()
+    target_preview = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ModerationItem
+        fields = ['id', 'post', 'comment', 'target_type', 'target_preview', 'status',
+                  'report_count', 'reporter_count', 'priority', 'last_reported_at',
+                  'resolution_details', 'created_at', 'updated_at']
+
+    def get_target_type(self, obj):
+        return 'comment' if obj.comment_id else 'post'
+
+    def get_target_preview(self, obj):
+        if obj.comment_id:
+            return obj.comment.content[:200]
+        return obj.post.title
@@ -1,68 +1,120 @@
 from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils import timezone
-from django.utils.text import slugify
 from django.db import transaction
-from .models import Category, Event, Post, Comment, User, UserProfile
-
-@receiver(pre_save, sender=Category)
-def category_pre_save(sender, instance, **kwargs):
-    if not instance.slug or (instance.pk and Category.objects.get(pk=instance.pk).name != instance.name):
-        instance.slug = slugify(instance.name)
+from .models import (
+    Category, Event, EventRegistration, Post, Comment, Report, User, UserProfile,
+    post_engagement_changed, posts_went_live,
+)
+from . import trending
+from . import cache
+from . import feed
+from . import moderation
 
+# Slugs are allocated by SlugMixin.save()
 @receiver(pre_save, sender=Event)
 def event_pre_save(sender, instance, **kwargs):
-    if not instance.slug:
-        instance.slug = slugify(instance.title)
     if instance.event_date < timezone.now():
         instance.status = 'past'
 
-@receiver(pre_save, sender=Post)
-def post_pre_save(sender, instance, **kwargs):
-    if not instance.slug:
-        instance.slug = slugify(instance.title)
-
 @receiver(post_save, sender=User)
 def handle_user_profile(sender, instance, created, **kwargs):
+    # Only new users need a profile; ordinary saves (logins, account edits)
+    # leave it alone. Bulk-created users go through UserProfile.objects.provision().
     if created:
         UserProfile.objects.get_or_create(user=instance)
-    instance.profile.save()
-
-@receiver([post_save, post_delete], sender=Comment)
-@transaction.atomic
-def update_comment_count(sender, instance, **kwargs):
-    post = instance.post
-    post.comments_count = post.comments.count()
-    post.save(update_fields=['comments_count'])
-    # The engagement score will be updated by the post_save signal on Post
-
-@receiver(pre_save, sender=Comment)
-def track_comment_edits(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            original = Comment.objects.get(pk=instance.pk)
-            if original.content != instance.content:
-                instance.edit_history = instance.edit_history or []
-                instance.edit_history.append({
-                    'previous_content': original.content,
-                    'edited_at': timezone.now().isoformat()
-                })
-                instance.is_edited = True
-        except Comment.DoesNotExist:
-            pass
 
 @receiver(m2m_changed, sender=Post.likes.through)
 def post_likes_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
-    """Update engagement score when likes are added or removed."""
-    if action in ["post_add", "post_remove"]:
-        instance.engagement_score = instance.calculate_engagement_score()
-        instance.save(update_fields=['engagement_score'])
+    """Keep likes_count and engagement_score in step with the likes table.
+
+    Django only reports genuinely new rows in pk_set for adds, but removals and
+    clears report what was asked for, so the rows that really exist are
+    captured in the pre_* phase and applied once the change is done.
+    """
+    if action == 'post_add' and pk_set:
+        post_ids = pk_set if reverse else [instance.pk]
+        amount = 1 if reverse else len(pk_set)
+        Post.objects.increment({pk: {'likes_count': amount} for pk in post_ids})
+    elif action in ('pre_remove', 'pre_clear'):
+        rows = sender.objects.filter(**{'user' if reverse else 'post': instance})
+        if action == 'pre_remove':
+            rows = rows.filter(**{'post_id__in' if reverse else 'user_id__in': pk_set})
+        if reverse:
+            removed = {pk: {'likes_count': -1} for pk in rows.values_list('post_id', flat=True)}
+        else:
+            count = rows.count()
+            removed = {instance.pk: {'likes_count': -count}} if count else {}
+        instance._likes_removed = removed
+    elif action in ('post_remove', 'post_clear'):
+        Post.objects.increment(getattr(instance, '_likes_removed', {}))
+        instance._likes_removed = {}
+
+def _refresh_trending(post_ids, categories=()):
+    transaction.on_commit(lambda: trending.refresh(post_ids, categories))
+
+@receiver(post_engagement_changed, sender=Post)
+def engagement_changed(sender, post_ids, **kwargs):
+    _refresh_trending(post_ids)
+
+@receiver([post_save, post_delete], sender=Post)
+def post_changed(sender, instance, **kwargs):
+    # The post leaves the board of the category it had when loaded
+    _refresh_trending([instance.pk], {instance._original_category_id, instance.category_id})
+
+@receiver(post_delete, sender=Post)
+def post_author_activity(sender, instance, **kwargs):
+    # A deleted post leaves nothing behind to mark its author for re-ranking
+    UserProfile.objects.filter(user_id=instance.author_id).update(updated_at=timezone.now())
+
+# Cache generations behind the conditional GET validators
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, **kwargs):
+    transaction.on_commit(lambda: cache.bump('community.category', 'community.post'))
+
+@receiver([post_save, post_delete], sender=Post)
+def category_counts_changed(sender, **kwargs):
+    transaction.on_commit(lambda: cache.bump('community.category-counts'))
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=UserProfile)
+def post_representation_changed(sender, **kwargs):
+    transaction.on_commit(lambda: cache.bump('community.post'))
+
+@receiver(post_engagement_changed, sender=Post)
+def post_counters_changed(sender, **kwargs):
+    transaction.on_commit(lambda: cache.bump('community.post'))
+
+@receiver([post_save, post_delete], sender=Event)
+@receiver([post_save, post_delete], sender=EventRegistration)
+def event_changed(sender, **kwargs):
+    transaction.on_commit(lambda: cache.bump('community.event'))
+
+@receiver(post_delete, sender=EventRegistration)
+def release_event_seat(sender, instance, **kwargs):
+    # Runs inside the delete's transaction, so the next waiter is promoted atomically
+    if instance.status == EventRegistration.CONFIRMED and Event.objects.release_seat(instance.event_id):
+        Event.objects.fill_from_waitlist(instance.event_id)
+
+@receiver(post_save, sender=Event)
+def event_capacity_changed(sender, instance, created, **kwargs):
+    if not created:
+        Event.objects.fill_from_waitlist(instance.pk)
 
 @receiver(post_save, sender=Post)
-def update_post_engagement_on_comment_change(sender, instance, **kwargs):
-    """Update engagement score when comments_count changes."""
-    if not kwargs.get('created', False): # Avoid infinite loop on post creation
-        if 'comments_count' in instance.tracker.changed():
-            instance.engagement_score = instance.calculate_engagement_score()
-            instance.save(update_fields=['engagement_score'])
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if instance.is_live and (created or not instance._was_live):
+        transaction.on_commit(lambda: feed.fan_out(instance))
 
+@receiver(posts_went_live, sender=Post)
+def scheduled_posts_live(sender, post_ids, **kwargs):
+    cache.bump('community.post', 'community.category-counts')
+    trending.refresh(post_ids)
+    for post in Post.objects.filter(pk__in=post_ids):
+        feed.fan_out(post)
+
+@receiver(post_save, sender=Report)
+def report_created(sender, instance, created, **kwargs):
+    if created:
+        moderation.record(instance)
@@ -0,0 +1,114 @@
+"""Unique slugs for posts, events and categories.
+
+allocate() slugifies a title and, when that slug is taken, appends the next
+free "-N" suffix. Each base has a SlugCounter row holding the next number,
+so a slug once handed out is not handed out again after its row is deleted
+and old URLs never point at new content. A counter starts past the suffixes
+already in use, found with one query over the slugs sharing the base; that
+query also steps over slugs that were set by hand. The counter rows are
+locked while numbers are handed out, and the unique index remains the
+arbiter: SlugMixin.save() retries the INSERT in a savepoint with a fresh
+slug if another row claimed the same one first. allocate_many() slugs a
+batch of unsaved objects for bulk_create() with a constant number of
+queries.
+"""
+import re
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Room kept at the end of a base for "-N"
+SUFFIX_LENGTH = 11
+
+
+def base_slug(model, text):
+    max_length = model._meta.get_field('slug').max_length
+    base = slugify(text)[:max_length - SUFFIX_LENGTH].strip('-')
+    return base or model._meta.model_name
+
+
+def _prefix_filter(bases):
+    query = Q()
+    for base in bases:
+        query |= Q(slug=base) | Q(slug__startswith=f'{base}-')
+    return query
+
+
+def _first_suffix(base, taken):
+    """0 when `base` itself is free, else one past the highest -N in use."""
+    if base not in taken:
+        return 0
+    suffix = re.compile(rf'^{re.escape(base)}-(\d+)$')
+    used = [int(match.group(1)) for match in map(suffix.match, taken) if match]
+    return max(used, default=1) + 1
+
+
+def _with_suffix(base, number):
+    return f'{base}-{number}' if number else base
+
+
+def _reserve(model, wanted, taken):
+    """Hand out wanted[base] suffix numbers per base, none of them used before.
+
+    Returns {base: [number, ...]}; 0 stands for the bare base.
+    """
+    from .models import SlugCounter
+    label = model._meta.label_lower
+    with transaction.atomic():
+        SlugCounter.objects.bulk_create(
+            [SlugCounter(model=label, base=base) for base in wanted], ignore_conflicts=True
+        )
+        counters = list(SlugCounter.objects.select_for_update().filter(model=label, base__in=wanted))
+        numbers = {}
+        for counter in counters:
+            number = max(counter.next_number, _first_suffix(counter.base, taken))
+            numbers[counter.base] = []
+            for _ in range(wanted[counter.base]):
+                while _with_suffix(counter.base, number) in taken:
+                    number = max(number + 1, 2)
+                numbers[counter.base].append(number)
+                number = max(number + 1, 2)
+            counter.next_number = number
+        SlugCounter.objects.bulk_update(counters, ['next_number'])
+    return numbers
+
+
+def allocate(instance, text):
+    """A slug for `instance` derived from `text` that no row holds or held."""
+    model = type(instance)
+    base = base_slug(model, text)
+    taken = set(
+        model._default_manager.filter(_prefix_filter([base]))
+        .exclude(pk=instance.pk).values_list('slug', flat=True)
+    )
+    if instance.slug and instance.slug not in taken and (
+        instance.slug == base or re.fullmatch(rf'{re.escape(base)}-\d+', instance.slug)
+    ):
+        return instance.slug  # A rename that slugifies the same keeps its slug
+    return _with_suffix(base, _reserve(model, {base: 1}, taken)[base][0])
+
+
+def allocate_many(objects):
+    """Give every unsaved object of one model without a slug a unique one.
+
+    Slugs already set on the batch are respected, and objects sharing a
+    title get consecutive suffixes. Returns the objects.
+    """
+    pending = [obj for obj in objects if not obj.slug]
+    if not pending:
+        return objects
+    model = type(pending[0])
+    bases = {id(obj): base_slug(model, obj.slug_source()) for obj in pending}
+    taken = set(
+        model._default_manager.filter(_prefix_filter(set(bases.values())))
+        .values_list('slug', flat=True)
+    )
+    taken.update(obj.slug for obj in objects if obj.slug)
+    wanted = {}
+    for base in bases.values():
+        wanted[base] = wanted.get(base, 0) + 1
+    numbers = _reserve(model, wanted, taken)
+    for obj in pending:
+        obj.slug = _with_suffix(bases[id(obj)], numbers[bases[id(obj)]].pop(0))
+    return objects
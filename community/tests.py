@@ -1,3 +1,628 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from rest_framework.test import APIClient
+
+from . import cache as community_cache
+from . import calendar
+from . import feed
+from . import moderation
+from . import scheduler
+from . import slugs
+from . import trending
+from .models import Category, Comment, Event, EventRegistration, ModerationItem, Post, Report, User, UserProfile
+from .serializers import PostSerializer
+
+# Tests that pin database statements run against a local cache, so the count
+# doesn't include round-trips to a database-backed cache (see CACHE_URL)
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CommentWritePipelineTests(TestCase):
+    """Pins the number of statements a comment create/edit/delete costs."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('commenter')
+        self.post = Post.objects.create(
+            title='Feeling anxious today',
+            slug='feeling-anxious-today',
+            content='x' * 60,
+            scheduled_publish_time=timezone.now(),
+        )
+
+    def test_create_top_level(self):
+        # INSERT, path UPDATE, post counters UPDATE
+        with self.assertNumQueries(3):
+            Comment.objects.create(post=self.post, author=self.user, content='First comment here')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.engagement_score, 1)
+
+    def test_create_reply(self):
+        parent = Comment.objects.create(post=self.post, content='First comment here')
+        with self.assertNumQueries(3):
+            reply = Comment.objects.create(post=self.post, content='A reply to it', parent_comment=parent)
+        self.assertEqual(reply.depth, 1)
+        self.assertEqual(reply.path, parent.path + f'{reply.pk:010d}')
+
+    def test_edit(self):
+        comment = Comment.objects.create(post=self.post, content='First comment here')
+        comment.content = 'Edited comment text'
+        # UPDATE plus one revision INSERT
+        with self.assertNumQueries(2):
+            comment.save()
+        comment.refresh_from_db()
+        self.assertTrue(comment.is_edited)
+        self.assertEqual(comment.revisions.count(), 1)
+
+    def test_delete_subtree(self):
+        parent = Comment.objects.create(post=self.post, content='First comment here')
+        Comment.objects.create(post=self.post, content='A reply to it', parent_comment=parent)
+        Comment.objects.create(post=self.post, content='Another top comment')
+        parent = Comment.objects.get(pk=parent.pk)
+        # Subtree count, the collector's reply lookups and cascaded DELETEs
+        # (revisions, reports, moderation items per level), then one post UPDATE
+        with self.assertNumQueries(11):
+            parent.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.engagement_score, 1)
+
+    def test_queryset_delete(self):
+        parent = Comment.objects.create(post=self.post, content='First comment here')
+        reply = Comment.objects.create(post=self.post, content='A reply to it', parent_comment=parent)
+        Comment.objects.create(post=self.post, content='A reply to the reply', parent_comment=reply)
+        Comment.objects.create(post=self.post, content='Another top comment')
+        # Selecting a reply along with its ancestor must not count it twice
+        Comment.objects.filter(pk__in=[parent.pk, reply.pk]).delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.comments.count(), 1)
+
+
+class PostCounterTests(TestCase):
+    def test_stale_update_keeps_counters(self):
+        author = User.objects.create_user('author')
+        post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            author=author, scheduled_publish_time=timezone.now(),
+        )
+        stale = Post.objects.get(pk=post.pk)
+        for i in range(2):
+            post.likes.add(User.objects.create_user(f'fan{i}'))
+        # What PostViewSet.update does with an instance loaded before the likes
+        serializer = PostSerializer(stale, data={'title': 'Feeling better today'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        post.refresh_from_db()
+        self.assertEqual((post.title, post.likes_count, post.engagement_score), ('Feeling better today', 2, 4))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class PostFeedPinningTests(TestCase):
+    def test_pinned_posts_are_capped_and_back_on_first_page(self):
+        now = timezone.now()
+        for prefix, count in (('pinned', 7), ('regular', 3)):
+            for i in range(count):
+                post = Post.objects.create(
+                    title=f'{prefix} {i}', slug=f'{prefix}-{i}', content='x' * 60,
+                    is_pinned=prefix == 'pinned', scheduled_publish_time=now,
+                )
+                Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(minutes=i))
+        first = self.client.get(reverse('post-list'), {'page_size': 2}).json()
+        self.assertEqual([row['slug'] for row in first['results']], [
+            'pinned-0', 'pinned-1', 'pinned-2', 'pinned-3', 'pinned-4', 'regular-0', 'regular-1',
+        ])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([row['slug'] for row in second['results']], ['regular-2'])
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+
+class SearchSnippetTests(TestCase):
+    def test_snippet_escapes_user_html(self):
+        Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today',
+            content='Feeling anxious <img src=x onerror=alert(1)> and tired of it all today',
+            scheduled_publish_time=timezone.now(),
+        )
+        response = self.client.get(reverse('community-search'), {'q': 'tired', 'type': 'post'})
+        snippet = response.json()['results'][0]['snippet']
+        self.assertNotIn('<img', snippet)
+        self.assertIn('&lt;img src=x onerror=alert(1)&gt;', snippet)
+        self.assertIn('<mark>tired</mark>', snippet)
+
+    @override_settings(COMMUNITY_AUTO_HIDE_THRESHOLD=3)
+    def test_hidden_comments_are_not_found(self):
+        post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            scheduled_publish_time=timezone.now(),
+        )
+        comment = Comment.objects.create(post=post, content='You are all tired and worthless')
+        Report.objects.create(reporter=User.objects.create_user('reporter'), post=post, comment=comment,
+                              report_type='abuse')
+        comment.refresh_from_db()
+        self.assertTrue(comment.is_hidden)
+        response = self.client.get(reverse('community-search'), {'q': 'tired'})
+        self.assertEqual(response.json()['results'], [])
+
+
+class CommentRevisionsViewTests(TestCase):
+    def test_hidden_comment_history_is_not_served(self):
+        post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            scheduled_publish_time=timezone.now(),
+        )
+        comment = Comment.objects.create(post=post, content='First draft of a reply')
+        comment.content = 'Edited reply'
+        comment.save()
+        url = reverse('post-comment-revisions', args=[post.pk, comment.pk])
+        self.assertEqual(self.client.get(url).json()[0]['previous_content'], 'First draft of a reply')
+        Comment.objects.filter(pk=comment.pk).update(is_hidden=True)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CategoryDetailValidatorTests(TestCase):
+    def test_new_post_changes_etag(self):
+        category = Category.objects.create(name='Anxiety', slug='anxiety', description='x' * 20)
+        url = reverse('category-detail', args=[category.pk])
+        first = self.client.get(url)
+        self.assertEqual(first.json()['post_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+                category=category, scheduled_publish_time=timezone.now(),
+            )
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['post_count'], 1)
+
+@override_settings(CACHES=LOCAL_CACHE)
+class TrendingRefreshTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.categories = [
+            Category.objects.create(name=name, slug=name.lower(), description='x' * 20)
+            for name in ('Anxiety', 'Sleep', 'Work')
+        ]
+        self.post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            category=self.categories[0], scheduled_publish_time=timezone.now(),
+        )
+        trending.rebuild()
+
+    def test_category_change_touches_only_its_boards(self):
+        anxiety, sleep, _ = self.categories
+        self.post.category = sleep
+        with mock.patch.object(trending, '_load', wraps=trending._load) as load:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.post.save()
+        self.assertEqual({call.args[0] for call in load.call_args_list}, {trending.ALL, anxiety.pk, sleep.pk})
+        self.assertEqual(trending.top_ids(anxiety.pk), [])
+        self.assertEqual(trending.top_ids(sleep.pk), [self.post.pk])
+        self.assertEqual(trending.top_ids(), [self.post.pk])
+
+    def test_locked_board_is_left_for_the_rebuild(self):
+        post_id = self.post.pk
+        lock = trending._cache_key(f'lock:{trending.ALL}')
+        cache.add(lock, 1)
+        with mock.patch.object(trending, 'BOARD_LOCK_WAIT', 0), self.captureOnCommitCallbacks(execute=True):
+            self.post.delete()
+        self.assertEqual(trending.top_ids(), [post_id])
+        self.assertEqual(trending.top_ids(self.categories[0].pk), [])
+        cache.delete(lock)
+        self.assertIsNone(trending.rebuild_if_due())
+        with override_settings(COMMUNITY_TRENDING_REBUILD_INTERVAL=0):
+            self.assertIsNotNone(trending.rebuild_if_due())
+        self.assertEqual(trending.top_ids(), [])
+
+@override_settings(CACHES=LOCAL_CACHE)
+class GenerationBumpTests(TestCase):
+    def test_bumped_after_commit(self):
+        post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            scheduled_publish_time=timezone.now(),
+        )
+        event = Event.objects.create(
+            title='Support group', slug='support-group', description='x' * 50,
+            status='upcoming', event_date=timezone.now() + timedelta(days=7), capacity=2,
+        )
+        before = [community_cache.version(name) for name in ('community.post', 'community.event')]
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(post=post, content='A comment here')
+            post.likes.add(User.objects.create_user('fan'))
+            EventRegistration.objects.create(event=event, user=User.objects.create_user('member'))
+            # Until the commit, other requests keep validating against the old generations
+            self.assertEqual([community_cache.version(name) for name in ('community.post', 'community.event')], before)
+        after = [community_cache.version(name) for name in ('community.post', 'community.event')]
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+
+class CategoryListCacheTests(TestCase):
+    def test_warm_list_reads_no_cache_table(self):
+        # Runs against the configured database-backed cache
+        Category.objects.create(name='Anxiety', slug='anxiety', description='x' * 20)
+        community_cache.bump('community.category', 'community.category-counts')
+        url = reverse('category-list')
+        with mock.patch.object(community_cache, 'LOCAL_GENERATION_TTL', 60):
+            self.client.get(url)
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+        self.assertEqual(response.json()[0]['name'], 'Anxiety')
+
+class SlugAllocationTests(TestCase):
+    def make_post(self, title='Feeling anxious today', **kwargs):
+        return Post.objects.create(title=title, content='x' * 60, scheduled_publish_time=timezone.now(), **kwargs)
+
+    def test_suffixes_are_not_reused(self):
+        first, second = self.make_post(), self.make_post()
+        self.assertEqual((first.slug, second.slug), ('feeling-anxious-today', 'feeling-anxious-today-2'))
+        second.delete()
+        first.delete()
+        self.assertEqual(self.make_post().slug, 'feeling-anxious-today-3')
+
+    def test_counter_starts_past_existing_slugs(self):
+        self.make_post(slug='feeling-anxious-today')
+        self.make_post(slug='feeling-anxious-today-7')
+        self.assertEqual(self.make_post().slug, 'feeling-anxious-today-8')
+
+    def test_allocate_many(self):
+        self.make_post()
+        posts = [Post(title=title, content='x' * 60) for title in ('Feeling anxious today', 'Sleep', 'Sleep')]
+        posts.append(Post(title='Sleep', slug='sleep-3', content='x' * 60))
+        # The slug lookup, then insert, lock and update the counters in a savepoint
+        with self.assertNumQueries(6):
+            slugs.allocate_many(posts)
+        self.assertEqual([post.slug for post in posts], ['feeling-anxious-today-2', 'sleep', 'sleep-2', 'sleep-3'])
+        Post.objects.bulk_create(posts)
+        self.assertEqual(self.make_post('Sleep').slug, 'sleep-4')
+
+    def test_retry_when_slug_is_claimed_concurrently(self):
+        claimed = self.make_post()
+        # The first allocation loses a race for the slug the existing post holds
+        with mock.patch.object(slugs, 'allocate', side_effect=[claimed.slug, 'fresh-slug']) as patched:
+            post = self.make_post()
+        self.assertEqual(patched.call_count, 2)
+        self.assertEqual(post.slug, 'fresh-slug')
+        self.assertTrue(Post.objects.filter(pk=post.pk, slug='fresh-slug').exists())
+
+    def test_other_integrity_errors_are_raised(self):
+        Category.objects.create(name='Anxiety', description='x' * 20)
+        with self.assertRaises(IntegrityError):
+            Category.objects.create(name='Anxiety', description='x' * 20)
+
+@override_settings(COMMUNITY_AUTO_HIDE_THRESHOLD=3)
+class ModerationRefreshTests(TestCase):
+    def setUp(self):
+        post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            scheduled_publish_time=timezone.now(),
+        )
+        self.comment = Comment.objects.create(post=post, content='A comment here')
+        self.report = Report.objects.create(
+            reporter=User.objects.create_user('reporter'), post=post, comment=self.comment, report_type='spam',
+        )
+        self.reports = Report.objects.filter(pk=self.report.pk)
+
+    def is_hidden(self):
+        return Comment.objects.values_list('is_hidden', flat=True).get(pk=self.comment.pk)
+
+    def test_edit_crossing_threshold_hides(self):
+        self.assertFalse(self.is_hidden())
+        self.reports.update(report_type='abuse')
+        moderation.refresh(moderation.items_for(self.reports))
+        self.assertTrue(self.is_hidden())
+
+    def test_deleted_reports_restore_content(self):
+        Report.objects.create(reporter=User.objects.create_user('other'), post=self.comment.post,
+                              comment=self.comment, report_type='inappropriate')
+        self.assertTrue(self.is_hidden())
+        item_ids = moderation.items_for(self.reports)
+        self.reports.delete()
+        moderation.refresh(item_ids)
+        self.assertFalse(self.is_hidden())
+
+    def test_resolved_reports_keep_content_hidden(self):
+        Report.objects.create(reporter=User.objects.create_user('other'), post=self.comment.post,
+                              comment=self.comment, report_type='inappropriate')
+        self.assertTrue(self.is_hidden())
+        moderation.close_reports(Report.objects.all(), 'resolved')
+        self.assertTrue(self.is_hidden())
+        self.assertEqual(ModerationItem.objects.get().status, 'resolved')
+
+class HomeFeedPublishTimeTests(TestCase):
+    def test_scheduled_post_lands_at_the_top(self):
+        category = Category.objects.create(name='Anxiety', slug='anxiety', description='x' * 20)
+        reader = User.objects.create_user('reader')
+        feed.subscribe(reader, category)
+        now = timezone.now()
+        scheduled = Post.objects.create(
+            title='Written last week', slug='written-last-week', content='x' * 60,
+            category=category, scheduled_publish_time=now + timedelta(hours=1),
+        )
+        Post.objects.filter(pk=scheduled.pk).update(created_at=now - timedelta(days=7))
+        with self.captureOnCommitCallbacks(execute=True):
+            posted = Post.objects.create(
+                title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+                category=category, scheduled_publish_time=now,
+            )
+        # The scheduler's sweep runs once the post is due
+        with mock.patch.object(timezone, 'now', return_value=now + timedelta(hours=2)), \
+                self.captureOnCommitCallbacks(execute=True):
+            scheduler.publish_due_posts()
+        self.assertEqual(feed.page(reader)[0], [Post.objects.get(pk=scheduled.pk), posted])
+        # A new subscriber's timeline is seeded in the same order
+        newcomer = User.objects.create_user('newcomer')
+        feed.subscribe(newcomer, category)
+        self.assertEqual(feed.page(newcomer)[0], [Post.objects.get(pk=scheduled.pk), posted])
+
+
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class EventWaitlistApiTests(TestCase):
+    def setUp(self):
+        self.event = Event.objects.create(
+            title='Support group', slug='support-group', description='x' * 50,
+            status='upcoming', event_date=timezone.now() + timedelta(days=7), capacity=1,
+        )
+        self.first, self.second = User.objects.create_user('first'), User.objects.create_user('second')
+
+    def test_waiter_is_promoted_when_a_seat_frees(self):
+        register = reverse('event-register', args=[self.event.pk])
+        registration = reverse('event-registration', args=[self.event.pk])
+        detail = reverse('event-detail', args=[self.event.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            first = api_client(self.first).post(register)
+            second = api_client(self.second).post(register)
+        self.assertEqual((first.status_code, first.json()['status']), (201, 'confirmed'))
+        self.assertEqual((second.json()['status'], second.json()['waitlist_position']), ('waitlisted', 1))
+        self.assertEqual(api_client(self.second).post(register).status_code, 400)
+        before = self.client.get(detail)
+        self.assertEqual(before.json()['available_seats'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(api_client(self.first).delete(registration).status_code, 204)
+        promoted = api_client(self.second).get(registration).json()
+        self.assertEqual((promoted['status'], promoted['waitlist_position']), ('confirmed', None))
+        # The seat moved to another user, so a cached copy of the event is stale
+        after = self.client.get(detail, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json()['seats_taken'], 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE, COMMUNITY_AUTO_HIDE_THRESHOLD=3)
+class AutoHideApiTests(TestCase):
+    def test_reported_comment_disappears_everywhere(self):
+        post = Post.objects.create(
+            title='Feeling anxious today', slug='feeling-anxious-today', content='x' * 60,
+            scheduled_publish_time=timezone.now(),
+        )
+        comment = Comment.objects.create(post=post, content='You are all tired and worthless')
+        comment.content = 'You are all tired'
+        comment.save()
+        posts = reverse('post-list')
+        before = self.client.get(posts)
+        self.assertEqual([c['id'] for c in before.json()['results'][0]['comments_preview']], [comment.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client(User.objects.create_user('reporter')).post(
+                reverse('report-list'), {'post': post.pk, 'comment': comment.pk, 'report_type': 'abuse'},
+            )
+        self.assertEqual(response.status_code, 201)
+        after = self.client.get(posts, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertEqual(after.json()['results'][0]['comments_preview'], [])
+        self.assertEqual(self.client.get(reverse('post-comments', args=[post.pk])).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('post-thread', args=[post.pk])).json()['results'], [])
+        self.assertEqual(self.client.get(reverse('community-search'), {'q': 'tired'}).json()['results'], [])
+        revisions = reverse('post-comment-revisions', args=[post.pk, comment.pk])
+        self.assertEqual(self.client.get(revisions).status_code, 404)
+        self.assertEqual(ModerationItem.objects.get(comment=comment).priority, 3)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class LeaderboardApiTests(TestCase):
+    def post_as(self, user, count):
+        for _ in range(count):
+            Post.objects.create(title='Feeling anxious today', content='x' * 60, author=user,
+                                scheduled_publish_time=timezone.now())
+
+    def leaderboard(self):
+        response = self.client.get(reverse('userprofile-leaderboard'))
+        return [(row['username'], row['community_rank']) for row in response.json()]
+
+    def test_leaderboard_follows_ranking_runs(self):
+        alice, bob = User.objects.create_user('alice'), User.objects.create_user('bob')
+        self.post_as(alice, 1)
+        call_command('rank_users', stdout=StringIO())
+        self.assertEqual(self.leaderboard(), [('alice', 1)])
+        self.post_as(bob, 2)
+        # Ranks only move when the job runs
+        self.assertEqual(self.leaderboard(), [('alice', 1)])
+        call_command('rank_users', stdout=StringIO())
+        self.assertEqual(self.leaderboard(), [('bob', 1), ('alice', 2)])
+        profile = self.client.get(reverse('userprofile-detail', args=[alice.profile.pk])).json()
+        self.assertEqual((profile['community_rank'], profile['community_score']), (2, 10))
+
+class EventSeatTests(TestCase):
+    def test_stale_save_keeps_seat_count(self):
+        event = Event.objects.create(
+            title='Support group', slug='support-group', description='x' * 50,
+            status='upcoming', event_date=timezone.now() + timedelta(days=7), capacity=2,
+        )
+        stale = Event.objects.get(pk=event.pk)
+        for i in range(2):
+            EventRegistration.objects.create(event=event, user=User.objects.create_user(f'member{i}'))
+        stale.title = 'Renamed support group'
+        stale.save()
+        late = EventRegistration.objects.create(event=event, user=User.objects.create_user('late'))
+        self.assertEqual(late.status, EventRegistration.WAITLISTED)
+        event.refresh_from_db()
+        self.assertEqual((event.title, event.seats_taken), ('Renamed support group', 2))
+
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class RegisteredCalendarTests(TestCase):
+    def setUp(self):
+        self.member = User.objects.create_user('member')
+        for title, seat_holder in (('Support group', self.member), ('Full workshop', User.objects.create_user('early'))):
+            event = Event.objects.create(
+                title=title, slug=slugify(title), description='x' * 50,
+                status='upcoming', event_date=timezone.now() + timedelta(days=7), capacity=1,
+            )
+            EventRegistration.objects.create(event=event, user=seat_holder)
+            EventRegistration.objects.get_or_create(event=event, user=self.member)
+
+    def feed(self, token):
+        return self.client.get(reverse('event-registered-calendar'), {'token': token})
+
+    def test_feed_lists_confirmed_registrations(self):
+        response = self.feed(calendar.feed_token(self.member))
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('SUMMARY:Support group', body)
+        self.assertNotIn('Full workshop', body)
+
+    def test_rotating_revokes_old_tokens(self):
+        old = calendar.feed_token(self.member)
+        new = calendar.rotate_token(self.member)
+        self.assertEqual(self.feed(old).status_code, 401)
+        self.assertEqual(self.feed(new).status_code, 200)
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AdminChangelistQueryTests(TestCase):
+    """Pins the statements per admin page, so per-row lookups can't creep back in."""
+    ROWS = 6
+    # Session and user, the count, one page of rows, then any list filter
+    # choices, date hierarchy bounds and the cached category counts
+    CHANGELIST_QUERIES = {
+        'post': 7,
+        'comment': 4,
+        'userprofile': 4,
+        'event': 8,
+        'eventregistration': 4,
+        'report': 4,
+        'moderationitem': 4,
+        'category': 6,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('moderator', 'moderator@example.com', 'password')
+        category = Category.objects.create(name='Anxiety', slug='anxiety', description='x' * 20)
+        event = Event.objects.create(
+            title='Support group', slug='support-group', description='x' * 50,
+            status='upcoming', event_date=timezone.now() + timedelta(days=7), capacity=3,
+        )
+        for i in range(cls.ROWS):
+            user = User.objects.create_user(f'member{i}')
+            post = Post.objects.create(
+                title=f'Post number {i}', slug=f'post-number-{i}', content='x' * 60,
+                author=user, category=category, scheduled_publish_time=timezone.now(),
+            )
+            comment = Comment.objects.create(post=post, author=user, content='A comment here')
+            EventRegistration.objects.create(event=event, user=user)
+            Report.objects.create(reporter=user, post=post, comment=comment, report_type='spam')
+            Report.objects.create(reporter=user, post=post, report_type='spam')
+        cls.post = post
+        for i in range(25):
+            Comment.objects.create(post=post, author=user, content=f'Comment number {i}')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        # The first request of a process runs the app's startup work
+        self.client.get(reverse('admin:index'))
+
+    def clear_caches(self):
+        cache.clear()
+        community_cache._local.clear()
+        community_cache._generations.clear()
+        ContentType.objects.clear_cache()
+
+    def test_changelists(self):
+        for model, expected in self.CHANGELIST_QUERIES.items():
+            url = reverse(f'admin:community_{model}_changelist')
+            self.clear_caches()
+            with self.subTest(model=model), self.assertNumQueries(expected):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_change_form_pages_comments(self):
+        url = reverse('admin:community_post_change', args=[self.post.pk])
+        self.clear_caches()
+        with self.assertNumQueries(9):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['inline_admin_formsets'][0].formset.forms), 20)
+        response = self.client.get(url + '?comments_page=2')
+        self.assertEqual(len(response.context['inline_admin_formsets'][0].formset.forms), 6)
+
+
+    def test_comment_change_form_replays_revisions_once(self):
+        queries = []
+        for edits in (1, 4):
+            comment = Comment.objects.create(post=self.post, author=self.admin, content='Version 0')
+            for i in range(1, edits + 1):
+                comment.content = f'Version {i}'
+                comment.save()
+            self.clear_caches()
+            with CaptureQueriesContext(connection) as captured:
+                response = self.client.get(reverse('admin:community_comment_change', args=[comment.pk]))
+            queries.append(sum('community_commentrevision' in q['sql'] for q in captured))
+        self.assertEqual(queries[0], queries[1])
+        for i in range(4):
+            self.assertContains(response, f'<pre>Version {i}</pre>', count=1)
+
+class UserProfileWriteTests(TestCase):
+    """Profiles are provisioned once, not rewritten on every User save."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('member', password='a long password')
+
+    def assertProfileUntouched(self, queries):
+        self.assertFalse([q['sql'] for q in queries if 'community_userprofile' in q['sql']])
+
+    def test_created_with_user(self):
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+
+    def test_login_and_profile_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('login'), {'username': 'member', 'password': 'a long password'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertProfileUntouched(queries)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(
+                reverse('profile'), {'first_name': 'Sam'}, content_type='application/json',
+                HTTP_AUTHORIZATION=f"Bearer {response.json()['token']}",
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertProfileUntouched(queries)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Sam')
+
+    def test_provision_bulk_created_users(self):
+        users = User.objects.bulk_create([User(username=f'imported{i}') for i in range(3)])
+        with self.assertNumQueries(2):
+            self.assertEqual(UserProfile.objects.provision(users), 3)
+        self.assertEqual(UserProfile.objects.provision(users + [self.user]), 0)
+        self.assertEqual(UserProfile.objects.filter(user__in=users).count(), 3)
@@ -0,0 +1,266 @@
+import bisect
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, When, Value, IntegerField
+from django.utils import timezone
+
+# Scores are log10(engagement) plus the post age measured in DECAY_SECONDS
+# units since EPOCH. Every DECAY_SECONDS a post needs ten times the
+# engagement to hold its place against newer posts (gravity-style decay),
+# but relative order never changes just because time passes, so the
+# leaderboards can be maintained incrementally instead of re-sorted.
+EPOCH = 1704067200  # 2024-01-01 UTC
+DECAY_SECONDS = 45000
+# Posts older than this would need an impossible engagement to compete
+# with fresh posts, so rebuilds only scan this window.
+REBUILD_WINDOW = timedelta(days=30)
+ALL = 'all'
+# A rebuild holds a cache lock for at most this long, so processes don't
+# all rebuild at once
+REBUILD_LOCK_TIMEOUT = 60
+# refresh() updates a board under a cache lock held for at most
+# BOARD_LOCK_TIMEOUT seconds, waiting up to BOARD_LOCK_WAIT for it; an
+# update that can't get the lock is left to the next periodic rebuild
+BOARD_LOCK_TIMEOUT = 5
+BOARD_LOCK_WAIT = 1
+
+_timer_lock = threading.Lock()
+_timer = None
+
+
+def board_size():
+    return getattr(settings, 'COMMUNITY_TRENDING_BOARD_SIZE', 200)
+
+
+def rebuild_interval():
+    """Seconds between rebuilds, which correct any drift of the incremental updates"""
+    return getattr(settings, 'COMMUNITY_TRENDING_REBUILD_INTERVAL', 900)
+
+
+def hot_score(engagement_score, created_at):
+    order = math.log10(max(engagement_score, 1))
+    return round(order + (created_at.timestamp() - EPOCH) / DECAY_SECONDS, 7)
+
+
+class Leaderboard:
+    """Bounded top-N list of (score, post_id), kept sorted best first."""
+
+    def __init__(self, entries=None, size=None):
+        self.size = size or board_size()
+        self.entries = list(entries or [])
+
+    def _keys(self):
+        return [(-score, -pk) for score, pk in self.entries]
+
+    def update(self, post_id, score):
+        """Insert or move a post; returns False if it does not make the board."""
+        self.remove(post_id)
+        if len(self.entries) >= self.size and (score, post_id) <= tuple(self.entries[-1]):
+            return False
+        index = bisect.bisect_left(self._keys(), (-score, -post_id))
+        self.entries.insert(index, (score, post_id))
+        del self.entries[self.size:]
+        return True
+
+    def remove(self, post_id):
+        for index, (_, pk) in enumerate(self.entries):
+            if pk == post_id:
+                del self.entries[index]
+                return True
+        return False
+
+    def top(self, limit):
+        return [pk for _, pk in self.entries[:limit]]
+
+    @classmethod
+    def build(cls, rows, size=None):
+        """Build from an iterable of (post_id, score) in O(P log N)."""
+        size = size or board_size()
+        best = heapq.nlargest(size, ((score, pk) for pk, score in rows))
+        return cls(best, size)
+
+
+def _cache_key(board):
+    return f'community:trending:{board}'
+
+
+def _load(board):
+    entries = cache.get(_cache_key(board))
+    if entries is None:
+        return None
+    return Leaderboard(entries)
+
+
+def _store(board, leaderboard):
+    cache.set(_cache_key(board), leaderboard.entries, None)
+
+
+@contextmanager
+def _locked(board):
+    """Hold the cache lock of one board; yields False if it couldn't be had."""
+    lock = _cache_key(f'lock:{board}')
+    deadline = time.monotonic() + BOARD_LOCK_WAIT
+    while not cache.add(lock, 1, BOARD_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            yield False
+            return
+        time.sleep(0.01)
+    try:
+        yield True
+    finally:
+        cache.delete(lock)
+
+
+def _rows(category_id=None):
+    """(post_id, category_id, score) of every live post in the rebuild window"""
+    from .models import Post
+    posts = Post.objects.published().filter(created_at__gte=timezone.now() - REBUILD_WINDOW)
+    if category_id is not None:
+        posts = posts.filter(category_id=category_id)
+    for pk, category, engagement, created_at in posts.values_list(
+        'pk', 'category_id', 'engagement_score', 'created_at'
+    ).iterator(chunk_size=2000):
+        yield pk, category, hot_score(engagement, created_at)
+
+
+def rebuild():
+    """Recompute every leaderboard from the database in a single pass.
+
+    Categories without recent posts get an empty board, so a missing board
+    always means it was evicted or never built.
+    """
+    from .models import Category
+    rows = defaultdict(list)
+    for category_id in Category.objects.values_list('pk', flat=True):
+        rows[category_id] = []
+    rows[ALL] = []
+    for pk, category_id, score in _rows():
+        rows[ALL].append((pk, score))
+        if category_id is not None:
+            rows[category_id].append((pk, score))
+    boards = {board: Leaderboard.build(entries) for board, entries in rows.items()}
+    cache.delete_many([_cache_key(board) for board in set(known_boards()) - set(boards)])
+    for board, leaderboard in boards.items():
+        # Waits out a refresh() in progress, which would store its older copy
+        with _locked(board):
+            _store(board, leaderboard)
+    cache.set_many({_cache_key('boards'): list(boards), _cache_key('built'): time.time()}, None)
+    return boards
+
+
+def rebuild_once():
+    """rebuild() unless another process already is; returns the boards or None."""
+    lock = _cache_key('rebuilding')
+    if not cache.add(lock, 1, REBUILD_LOCK_TIMEOUT):
+        return None
+    try:
+        return rebuild()
+    finally:
+        cache.delete(lock)
+
+
+def rebuild_if_due():
+    """Rebuild when the boards are older than rebuild_interval()."""
+    built = cache.get(_cache_key('built'))
+    if built is not None and time.time() - built < rebuild_interval():
+        return None
+    return rebuild_once()
+
+
+def known_boards():
+    return cache.get(_cache_key('boards')) or []
+
+
+def refresh(post_ids, categories=()):
+    """Re-score the given posts on the ALL board and their category boards.
+
+    `categories` are boards the posts may have left: their category before
+    an edit, or the category of a deleted post. Boards that are missing are
+    left alone; the next read rebuilds them.
+    """
+    from .models import Post
+    post_ids = set(post_ids)
+    if not post_ids or not known_boards():
+        return  # Nothing built yet; the next read rebuilds from the DB.
+    current = dict(Post.objects.filter(pk__in=post_ids).values_list('pk', 'category_id'))
+    live = {
+        pk: (category_id, hot_score(engagement, created_at))
+        for pk, category_id, engagement, created_at in
+        Post.objects.published().filter(pk__in=post_ids)
+        .values_list('pk', 'category_id', 'engagement_score', 'created_at')
+    }
+    boards = {ALL} | {board for board in (*categories, *current.values()) if board is not None}
+    for board in boards:
+        with _locked(board) as acquired:
+            leaderboard = _load(board) if acquired else None
+            if leaderboard is None:
+                continue
+            changed = False
+            for pk in post_ids:
+                if pk in live and board in (ALL, live[pk][0]):
+                    changed |= leaderboard.update(pk, live[pk][1])
+                else:
+                    changed |= leaderboard.remove(pk)
+            if changed:
+                _store(board, leaderboard)
+
+
+def arm():
+    """Start this process's timer for rebuild_if_due(), if it isn't running."""
+    global _timer
+    with _timer_lock:
+        if _timer is not None:
+            return
+        _timer = threading.Timer(rebuild_interval(), _fire)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _fire():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        rebuild_if_due()
+    finally:
+        connections.close_all()
+        arm()
+
+
+def top_ids(category_id=None, limit=20):
+    """Ids of the hottest live posts, best first."""
+    board = ALL if category_id is None else category_id
+    leaderboard = _load(board)
+    if leaderboard is None:
+        leaderboard = _fill(board)
+    return leaderboard.top(limit)
+
+
+def _fill(board):
+    """A board that is missing from the cache: rebuild them all, unless
+    another process already is, in which case read it from the database."""
+    boards = rebuild_once()
+    if boards is not None:
+        return boards.get(board) or Leaderboard()
+    rows = _rows(None if board == ALL else board)
+    return Leaderboard.build((pk, score) for pk, _, score in rows)
+
+
+def ordered(queryset, post_ids):
+    """Restrict a queryset to post_ids and keep their leaderboard order."""
+    if not post_ids:
+        return queryset.none()
+    position = Case(
+        *[When(pk=pk, then=Value(index)) for index, pk in enumerate(post_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=post_ids).order_by(position)
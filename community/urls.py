@@ -8,7 +8,10 @@ router.register(r'posts', views.PostViewSet)
 router.register(r'events', views.EventViewSet)
 router.register(r'profiles', views.UserProfileViewSet)
 router.register(r'reports', views.ReportViewSet)
+router.register(r'moderation', views.ModerationQueueViewSet, basename='moderation')
 
 urlpatterns = [
+    path('feed/', views.FeedView.as_view(), name='community-feed'),
+    path('search/', views.SearchView.as_view(), name='community-search'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,87 +1,474 @@
-from rest_framework import viewsets, permissions, status
+import bisect
+from datetime import datetime
+
+from rest_framework import viewsets, permissions, status, exceptions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db import transaction
+from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
+from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 from .models import *
 from .serializers import *
+from .counters import post_counters
+from .pagination import (
+    PostCursorPagination, CommentCursorPagination, EventCursorPagination, ModerationCursorPagination,
+)
+from .revisions import history
+from . import search
+from .conditional import ConditionalGetMixin
+from . import cache as community_cache
+from . import feed
+from . import calendar
+from . import moderation
+from . import ranking
+from . import activity
+
+def _int_param(request, name, default=None, maximum=None):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise exceptions.ValidationError({name: 'Must be an integer.'})
+    if value < 0:
+        raise exceptions.ValidationError({name: 'Must not be negative.'})
+    return min(value, maximum) if maximum else value
+
+def _datetime_param(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = day and datetime.combine(day, datetime.min.time())
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise exceptions.ValidationError({name: 'Must be an ISO 8601 date or datetime.'})
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+class SlugRouteMixin:
+    """Adds slug/<slug>/, the detail view looked up by slug instead of id"""
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'], url_path=r'slug/(?P<slug>[-\w]+)', url_name='slug')
+    def by_slug(self, request, slug=None):
+        self.lookup_field = 'slug'
+        return self.retrieve(request, slug=slug)
+
+class CategoryViewSet(SlugRouteMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
-class PostViewSet(viewsets.ModelViewSet):
+    def _validator_scope(self, request):
+        # post_count comes from the category-counts cache, not the row
+        counts = community_cache.version('community.category-counts')
+        return f'{super()._validator_scope(request)}:{counts}'
+
+    def list_validator(self, request):
+        # Both inputs are cached, so validating costs no queries
+        return self._etag(
+            community_cache.version('community.category'),
+            community_cache.version('community.category-counts'),
+        ), None
+
+    def list(self, request, *args, **kwargs):
+        """Category list served from the category cache."""
+        def respond():
+            counts = community_cache.category_post_counts()
+            return Response([
+                dict(category, post_count=counts.get(category['id'], 0))
+                for category in community_cache.categories()
+            ])
+        return self.conditional(request, self.list_validator(request), respond)
+
+    @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
+    def subscribe(self, request, pk=None):
+        """Follow (POST) or unfollow (DELETE) a category in the home feed."""
+        category = self.get_object()
+        if request.method == 'POST':
+            feed.subscribe(request.user, category)
+        else:
+            feed.unsubscribe(request.user, category)
+        return Response({'subscribed': request.method == 'POST'})
+
+class PostViewSet(SlugRouteMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     queryset = Post.objects.all()  # Added this line
+    pagination_class = PostCursorPagination
+    per_user_representation = True  # liked_by_me
 
     def get_queryset(self):
-        queryset = Post.objects.published().select_related('author', 'category')
-
-        if self.request.query_params.get('category'):
-            queryset = queryset.filter(category__slug=self.request.query_params.get('category'))
+        queryset = Post.objects.published().select_related('author__profile', 'category')
+        category = self.request.query_params.get('category')
 
         if self.request.query_params.get('trending'):
-            queryset = queryset.order_by('-engagement_score')[:20]
+            category_id = None
+            if category:
+                category_id = Category.objects.filter(slug=category).values_list('pk', flat=True).first()
+                if category_id is None:
+                    return queryset.none()
+            return Post.objects.trending(category_id).select_related('author__profile', 'category')
+
+        if category:
+            queryset = queryset.filter(category__slug=category)
 
         return queryset
 
+    def paginate_queryset(self, queryset):
+        # Trending is already a bounded top-N list
+        if self.request.query_params.get('trending'):
+            return None
+        return super().paginate_queryset(queryset)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def retrieve(self, request, *args, **kwargs):
         """Increment views count when a post is retrieved."""
         instance = self.get_object()
-        instance.views += 1
-        instance.engagement_score = instance.calculate_engagement_score()
-        instance.save(update_fields=['views', 'engagement_score'])
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        post_counters.incr(instance.pk, 'views')
+
+        def respond():
+            # Show the count including views still waiting in the buffer
+            instance.views += post_counters.pending(instance.pk, 'views')
+            return Response(self.get_serializer(instance).data)
+        return self.conditional(request, self.detail_validator(request, instance.updated_at), respond)
+
+    @action(detail=True, methods=['get'], pagination_class=CommentCursorPagination)
+    def comments(self, request, pk=None):
+        """Full, paginated comment list for a post."""
+        post = self.get_object()
+        queryset = post.comments.visible().select_related('author__profile')
+        page = self.paginate_queryset(queryset)
+        serializer = CommentSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path=r'comments/(?P<comment_id>\d+)/revisions')
+    def comment_revisions(self, request, pk=None, comment_id=None):
+        """Edit history of one comment, newest edit first."""
+        post = self.get_object()
+        comment = get_object_or_404(post.comments.visible(), pk=comment_id)
+        revisions = []
+        for revision, previous_content in history(comment.content, comment.revisions.all()):
+            revision.previous_content = previous_content
+            revisions.append(revision)
+        return Response(CommentRevisionSerializer(revisions, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def thread(self, request, pk=None):
+        """Nested comments in display order, optionally only below ?root=<comment id>.
+
+        ?depth limits nesting below the root; comments whose replies were cut
+        off are flagged and can be expanded with ?root=<their id>. Pages are
+        continued with the `next` link.
+        """
+        post = self.get_object()
+        root = None
+        if request.query_params.get('root'):
+            root = get_object_or_404(post.comments.visible(), pk=_int_param(request, 'root'))
+        max_depth = _int_param(request, 'depth')
+        limit = _int_param(request, 'limit', 50, maximum=200) or 50
+        comments = list(
+            Comment.objects.thread(post, root, max_depth, after=request.query_params.get('after'))
+            .select_related('author__profile')[:limit + 1]
+        )
+        next_link = None
+        if len(comments) > limit:
+            comments = comments[:limit]
+            next_link = replace_query_param(request.build_absolute_uri(), 'after', comments[-1].path)
+
+        context = self.get_serializer_context()
+        if max_depth is not None:
+            edge_depth = (root.depth if root else 0) + max_depth
+            edge = [comment.pk for comment in comments if comment.depth == edge_depth]
+            context['collapsed_comments'] = set(
+                Comment.objects.visible().filter(parent_comment_id__in=edge)
+                .values_list('parent_comment_id', flat=True).distinct()
+            ) if edge else set()
+        serializer = CommentThreadSerializer(comments, many=True, context=context)
+        return Response({'next': next_link, 'results': serializer.data})
+
+    @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
+    def like(self, request, pk=None):
+        """Like (POST) or unlike (DELETE) a post; repeating either is a no-op."""
+        post = self.get_object()
+        likes = Post.likes.through.objects
+        with transaction.atomic():
+            if request.method == 'POST':
+                _, changed = likes.get_or_create(post=post, user=request.user)
+                delta = 1
+            else:
+                changed = likes.filter(post=post, user=request.user).delete()[0] > 0
+                delta = -1
+            if changed:
+                Post.objects.increment({post.pk: {'likes_count': delta}})
+        likes_count = Post.objects.filter(pk=post.pk).values_list('likes_count', flat=True).first()
+        return Response({'liked': request.method == 'POST', 'likes_count': likes_count})
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def share(self, request, pk=None):
         """Increment shares count for a post."""
-        try:
-            post = self.get_object()
-            post.shares += 1
-            post.engagement_score = post.calculate_engagement_score()
-            post.save(update_fields=['shares', 'engagement_score'])
-            return Response({'message': 'Post shared successfully.'}, status=status.HTTP_200_OK)
-        except Post.DoesNotExist:
-            return Response({'error': 'Post not found.'}, status=status.HTTP_404_NOT_FOUND)
-
-class EventViewSet(viewsets.ModelViewSet):
+        post = self.get_object()
+        post_counters.incr(post.pk, 'shares')
+        return Response({'message': 'Post shared successfully.'}, status=status.HTTP_200_OK)
+
+class EventViewSet(SlugRouteMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+    """Events in date order.
+
+    ?from and ?to select a half-open [from, to) range of event_date and
+    ?status=upcoming|past filters on the effective status. The calendar
+    actions stream the same selection as iCalendar.
+    """
     queryset = Event.objects.all()
     serializer_class = EventSerializer
+    pagination_class = EventCursorPagination
+
+    def get_queryset(self):
+        now = timezone.now()
+        wanted = self.request.query_params.get('status')
+        if wanted == 'upcoming':
+            queryset = Event.objects.upcoming(now)
+        elif wanted == 'past':
+            queryset = Event.objects.past(now)
+        else:
+            queryset = Event.objects.with_effective_status(now)
+        start = _datetime_param(self.request, 'from')
+        if start:
+            queryset = queryset.filter(event_date__gte=start)
+        end = _datetime_param(self.request, 'to')
+        if end:
+            queryset = queryset.filter(event_date__lt=end)
+        if self.action == 'registered_calendar':
+            queryset = queryset.filter(
+                registrations__user_id=self._calendar_user_id(),
+                registrations__status=EventRegistration.CONFIRMED,
+            )
+        return queryset
+
+    def _validator_scope(self, request):
+        # Effective status changes as event dates pass, not only on writes
+        passed = bisect.bisect_left(community_cache.upcoming_event_dates(), timezone.now())
+        scope = f'{super()._validator_scope(request)}:{passed}'
+        if self.action == 'registered_calendar':
+            scope += f':{self._calendar_user_id()}'
+        return scope
+
+    def _calendar_user_id(self):
+        if self.request.user.is_authenticated:
+            return self.request.user.pk
+        if not hasattr(self, '_token_user_id'):
+            self._token_user_id = calendar.user_id_from_token(self.request.query_params.get('token', ''))
+        if self._token_user_id is None:
+            raise exceptions.NotAuthenticated()
+        return self._token_user_id
+
+    def _calendar(self, request, name):
+        events = self.get_queryset().order_by('event_date', 'id').only(
+            'id', 'title', 'description', 'location', 'event_date', 'updated_at'
+        )
+        return self.conditional(request, self.list_validator(request), lambda: StreamingHttpResponse(
+            calendar.stream(events, name, request.get_host()),
+            content_type='text/calendar; charset=utf-8',
+        ))
+
+    @action(detail=False, url_path='calendar', url_name='calendar',
+            renderer_classes=[calendar.ICalendarRenderer])
+    def calendar_feed(self, request, format=None):
+        return self._calendar(request, 'Community events')
+
+    @action(detail=False, url_path='calendar/registered', renderer_classes=[calendar.ICalendarRenderer])
+    def registered_calendar(self, request, format=None):
+        """The events a user registered for; authenticate or pass ?token."""
+        return self._calendar(request, 'My events')
+
+    @action(detail=False, methods=['get', 'post'], url_path='calendar/token',
+            permission_classes=[permissions.IsAuthenticated])
+    def calendar_token(self, request):
+        """The user's feed token and URL; POST revokes the old ones and issues new ones."""
+        if request.method == 'POST':
+            token = calendar.rotate_token(request.user)
+        else:
+            token = calendar.feed_token(request.user)
+        url = replace_query_param(
+            request.build_absolute_uri(reverse('event-registered-calendar')), 'token', token
+        )
+        return Response({'token': token, 'url': url})
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def register(self, request, pk=None):
-        with transaction.atomic():
-            event = Event.objects.select_for_update().get(pk=pk)
+        event = self.get_object()
+
+        if event.registration_deadline and event.registration_deadline < timezone.now():
+            return Response({'error': 'Registration closed'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if event.registration_deadline and event.registration_deadline < timezone.now():
-                return Response({'error': 'Registration closed'}, status=status.HTTP_400_BAD_REQUEST)
+        if EventRegistration.objects.filter(event=event, user=request.user).exists():
+            return Response({'error': 'Already registered'}, status=status.HTTP_400_BAD_REQUEST)
 
-            if event.available_seats <= 0:
-                return Response({'error': 'Event is full'}, status=status.HTTP_400_BAD_REQUEST)
+        # save() claims a seat with a conditional UPDATE or joins the
+        # waitlist; a racing duplicate fails the unique constraint.
+        try:
+            with transaction.atomic():
+                registration = EventRegistration.objects.create(event=event, user=request.user)
+        except IntegrityError:
+            return Response({'error': 'Already registered'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            EventRegistrationSerializer(registration).data,
+            status=status.HTTP_201_CREATED
+        )
 
-            if EventRegistration.objects.filter(event=event, user=request.user).exists():
-                return Response({'error': 'Already registered'}, status=status.HTTP_400_BAD_REQUEST)
+    @action(detail=True, methods=['get', 'delete'], permission_classes=[permissions.IsAuthenticated])
+    def registration(self, request, pk=None):
+        """The user's registration status and waitlist position; DELETE cancels it.
 
-            registration = EventRegistration.objects.create(event=event, user=request.user)
-            return Response(
-                EventRegistrationSerializer(registration).data,
-                status=status.HTTP_201_CREATED
-            )
+        Polling this is a couple of indexed lookups, and waiters are promoted
+        automatically, so there's no need to retry register.
+        """
+        registration = get_object_or_404(
+            EventRegistration.objects.select_related('user'), event_id=pk, user=request.user
+        )
+        if request.method == 'DELETE':
+            registration.delete()
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(EventRegistrationSerializer(registration).data)
 
 class UserProfileViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = UserProfile.objects.all()
     serializer_class = UserProfileSerializer
 
+    @action(detail=False)
+    def leaderboard(self, request):
+        """Top ranked users (?limit, at most ranking.LEADERBOARD_SIZE), as of the last ranking run"""
+        limit = _int_param(request, 'limit', ranking.LEADERBOARD_SIZE, maximum=ranking.LEADERBOARD_SIZE)
+        return Response(ranking.leaderboard()[:limit])
+
+    @action(detail=False, permission_classes=[permissions.IsAdminUser])
+    def active(self, request):
+        """Number of users active in the last ?minutes (default COMMUNITY_ACTIVITY_INTERVAL)"""
+        minutes = _int_param(request, 'minutes') or activity.activity_interval()
+        return Response({'minutes': minutes, 'active': activity.active_count(minutes)})
+
 class ReportViewSet(viewsets.ModelViewSet):
+    """Users see and edit their own reports; staff see all of them.
+
+    Edits and deletions recount the report's moderation item. A report's
+    target can't be changed after it is filed.
+    """
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        if self.request.user.is_staff:
+            return Report.objects.all()
+        return Report.objects.filter(reporter=self.request.user)
+
     def perform_create(self, serializer):
-        serializer.save(reporter=self.request.user)
\ No newline at end of file
+        serializer.save(reporter=self.request.user)
+
+    def perform_update(self, serializer):
+        report = serializer.instance
+        with transaction.atomic():
+            report = serializer.save(post=report.post, comment=report.comment)
+            moderation.refresh(
+                moderation.items_for(Report.objects.filter(pk=report.pk)), restore=report.status != 'resolved'
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            item_ids = moderation.items_for(Report.objects.filter(pk=instance.pk))
+            instance.delete()
+            moderation.refresh(item_ids)
+
+class ModerationQueueViewSet(viewsets.ReadOnlyModelViewSet):
+    """Reported content grouped per post or comment, newest item first.
+
+    ?status=open|resolved|dismissed (default open). POST a list of item ids
+    to resolve/ or dismiss/ to close them and all their pending reports.
+    """
+    serializer_class = ModerationItemSerializer
+    permission_classes = [permissions.IsAdminUser]
+    pagination_class = ModerationCursorPagination
+
+    def get_queryset(self):
+        wanted = self.request.query_params.get('status', 'open')
+        return ModerationItem.objects.filter(status=wanted).select_related('post', 'comment')
+
+    def _close(self, request, status_value):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not all(isinstance(pk, int) for pk in ids):
+            raise exceptions.ValidationError({'ids': 'Must be a list of moderation item ids.'})
+        closed = moderation.close(
+            ModerationItem.objects.filter(pk__in=ids), status_value,
+            request.data.get('resolution_details', ''),
+        )
+        return Response({'closed': closed})
+
+    @action(detail=False, methods=['post'])
+    def resolve(self, request):
+        return self._close(request, 'resolved')
+
+    @action(detail=False, methods=['post'])
+    def dismiss(self, request):
+        return self._close(request, 'dismissed')
+
+class SearchView(APIView):
+    """Ranked full-text search over posts and comments.
+
+    ?q is the query, ?type=post|comment narrows the results and ?page/?page_size
+    paginate. Each hit has an HTML-escaped snippet with matches wrapped in <mark>.
+    """
+    page_size = 20
+    max_page_size = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        kinds = ('post', 'comment')
+        if request.query_params.get('type') in kinds:
+            kinds = (request.query_params['type'],)
+        page = _int_param(request, 'page', 1) or 1
+        page_size = _int_param(request, 'page_size', self.page_size, maximum=self.max_page_size) or self.page_size
+
+        hits = search.search(query, limit=page_size + 1, offset=(page - 1) * page_size, kinds=kinds)
+        if hits is None:
+            return Response({'error': 'Search is not available.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        next_link = None
+        if len(hits) > page_size:
+            hits = hits[:page_size]
+            next_link = replace_query_param(request.build_absolute_uri(), 'page', page + 1)
+
+        posts = Post.objects.only('id', 'title', 'slug').in_bulk({hit['post_id'] for hit in hits})
+        for hit in hits:
+            post = posts.get(hit['post_id'])
+            hit['post'] = {'id': post.pk, 'title': post.title, 'slug': post.slug} if post else None
+        return Response({'next': next_link, 'results': hits})
+
+
+class FeedView(APIView):
+    """Home feed of posts from the categories the user follows, newest first."""
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 20
+    max_page_size = 100
+
+    def get(self, request):
+        cursor = None
+        if request.query_params.get('cursor'):
+            try:
+                cursor = feed.decode_cursor(request.query_params['cursor'])
+            except ValueError:
+                raise exceptions.NotFound('Invalid cursor')
+        limit = _int_param(request, 'page_size', self.page_size, maximum=self.max_page_size) or self.page_size
+        posts, next_cursor = feed.page(request.user, cursor, limit)
+        serializer = PostSerializer(posts, many=True, context={'request': request, 'view': self})
+        next_link = None
+        if next_cursor:
+            next_link = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+        return Response({'next': next_link, 'results': serializer.data})
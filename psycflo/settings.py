@@ -58,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'community.activity.LastActiveMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -133,6 +134,16 @@ DATABASES = {
     'default': dj_database_url.config(conn_max_age=600)
 }
 
+# The community app's caches and invalidation generations must be shared by
+# every web worker and cron process. Defaults to a table in the main database
+# (python manage.py createcachetable); set CACHE_URL, e.g. redis://host:6379/0
+# with the redis package installed, for a faster backend.
+CACHES = {
+    'default': env.cache_url(
+        'CACHE_URL', default='dbcache://community_cache?max_entries=100000&cull_frequency=4'
+    )
+}
+
 # }
 
 